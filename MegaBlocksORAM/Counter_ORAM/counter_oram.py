@@ -1,9 +1,32 @@
+import functools
+import itertools
 import math
-from MegaBlocksORAM.Simulation_ORAM.counter_hash_table import HashTable
-from RemoteRam.counter_remote_ram import CounterRemoteRam
+from MegaBlocksORAM.Simulation_ORAM.counter_hash_table import ht_build_cost, ht_extract_cost
 from config.utils import choose_C
 
 
+@functools.lru_cache(maxsize=None)
+def _ht_size(level_index, load_factor, q, number_of_levels, N):
+    """
+    Calculates the effective size of a level; see CounterMegaBlocksORAM.calc_ht_size.
+    """
+    if level_index == 0:
+        return load_factor
+    elif level_index == number_of_levels - 1:
+        return N
+    else:
+        return q ** level_index * load_factor
+
+
+@functools.lru_cache(maxsize=None)
+def _build_extract_cost(n, B):
+    """
+    Returns the pair (build_cost, extract_cost) of a hash table of n elements, computed from the closed-form
+    I/O counts of the simulation hash table. The result only depends on (n, B), so it is cached.
+    """
+    return sum(ht_build_cost(n, B)), sum(ht_extract_cost(n, B))
+
+
 class CounterMegaBlocksORAM:
     def __init__(self, N, B, q, T, local_memory_in_server_blocks=2):
         """
@@ -21,16 +44,20 @@ class CounterMegaBlocksORAM:
         self.q = q
         self.T = T
         self.number_of_levels = math.floor(math.log(self.N, q)) + 1
+        # Integer powers of q used throughout the cost formulas (q^0 ... q^number_of_levels).
+        self._q_pow = [q ** i for i in range(self.number_of_levels + 1)]
         self.rebuild_costs = [0 for _ in range(self.number_of_levels)]
-        # Create a 2D list to store build/extract costs for each level (dimensions: number_of_levels x (q-1)).
-        self.table_build_extract_costs = [[(0, 0)] * (q - 1) for _ in range(self.number_of_levels)]
+        # 2D lists of the build and extract costs for each level (dimensions: number_of_levels x (q-1)).
+        self.table_build_costs = [[0] * (q - 1) for _ in range(self.number_of_levels)]
+        self.table_extract_costs = [[0] * (q - 1) for _ in range(self.number_of_levels)]
         self.build_total_costs = [(0, 0)] * self.number_of_levels
         self.local_memory_in_server_blocks = local_memory_in_server_blocks
         self.inner_tables = []
         # Determine which levels use local memory.
         for i in range(self.number_of_levels):
-            if math.ceil((q ** i) * (q - 1) / B) < self.local_memory_in_server_blocks:
-                self.local_memory_in_server_blocks -= math.ceil((q ** i) * (q - 1) / B)
+            level_blocks = -(-self._q_pow[i] * (q - 1) // B)  # ceil(q^i * (q - 1) / B)
+            if level_blocks < self.local_memory_in_server_blocks:
+                self.local_memory_in_server_blocks -= level_blocks
                 self.inner_tables.append(i)
 
     def calc_build_extract_costs(self):
@@ -46,7 +73,21 @@ class CounterMegaBlocksORAM:
                 continue
             for j in range(self.q - 1):
                 n = self.calc_ht_size(i, j + 1)
-                self.table_build_extract_costs[i][j] = self.calc_build_extract_with_ht(n)
+                self.table_build_costs[i][j], self.table_extract_costs[i][j] = self.calc_build_extract_with_ht(n)
+        self.calc_cost_prefix_sums()
+
+    def calc_cost_prefix_sums(self):
+        """
+        Precomputes the cumulative sums used by total_rebuild_cost.
+
+        _extract_prefix[i] is the extraction cost of all levels below i (each at full load q-1).
+        _build_prefix[i][r] and _extract_level_prefix[i][r] are the build/extract costs of the
+        first r load factors of level i.
+        """
+        self._extract_prefix = list(itertools.accumulate(
+            (costs[self.q - 2] for costs in self.table_extract_costs), initial=0))
+        self._build_prefix = [list(itertools.accumulate(costs, initial=0)) for costs in self.table_build_costs]
+        self._extract_level_prefix = [list(itertools.accumulate(costs, initial=0)) for costs in self.table_extract_costs]
 
     def calc_ht_size(self, level_index, load_factor):
         """
@@ -63,12 +104,7 @@ class CounterMegaBlocksORAM:
         Returns:
           int: The effective size for the level.
         """
-        if level_index == 0:
-            return load_factor
-        elif level_index == self.number_of_levels - 1:
-            return self.N
-        else:
-            return math.ceil(int(math.pow(self.q, level_index) * load_factor))
+        return _ht_size(level_index, load_factor, self.q, self.number_of_levels, self.N)
 
     def total_lookup_cost(self, T, q):
         """
@@ -92,8 +128,8 @@ class CounterMegaBlocksORAM:
             if level == self.number_of_levels - 1:
                 total_cost += 2 * T
                 continue
-            cycle_length = (q ** (level + 1))
-            inactive = q ** level
+            cycle_length = self._q_pow[level + 1]
+            inactive = self._q_pow[level]
             active = cycle_length - inactive
             full_cycles = T // cycle_length
             remainder = T % cycle_length
@@ -118,17 +154,17 @@ class CounterMegaBlocksORAM:
         Returns:
           float: The estimated total compaction cost.
         """
-        tables_capacity_sum = self.q ** (self.number_of_levels - 1)
+        tables_capacity_sum = self._q_pow[self.number_of_levels - 1]
         compaction_times = T // tables_capacity_sum
         # rest of compactions
         compaction_input_size = 0
         for i in range(self.number_of_levels):
             compaction_input_size += self.calc_ht_size(i, self.q - 1)
-        compaction_input_size = math.ceil(compaction_input_size / self.B)
+        compaction_input_size = -(-compaction_input_size // self.B)
         C = choose_C(compaction_input_size * self.B, self.B)
-        compaction_output_size = math.ceil(self.N / self.B)
+        compaction_output_size = -(-self.N // self.B)
 
-        return compaction_times * (compaction_output_size + 2 * C * math.log(C, 2) + C + 3 * compaction_input_size + C - 2 * compaction_input_size)
+        return compaction_times * (compaction_output_size + 2 * C * (C.bit_length() - 1) + C + 3 * compaction_input_size + C - 2 * compaction_input_size)
 
     def total_rebuild_cost(self, T, q):
         """
@@ -152,37 +188,28 @@ class CounterMegaBlocksORAM:
             if i in self.inner_tables:
                 continue
             if i == self.number_of_levels - 1:
-                counter = T // (q ** (self.number_of_levels - 1))
-                extract_cost_lower_levels = 0
+                counter = T // self._q_pow[self.number_of_levels - 1]
                 # Extraction cost of lower levels.
-                for j in range(i):
-                    extract_cost_lower_levels += self.table_build_extract_costs[j][q - 2][1]
-                build_extract_current_level = self.table_build_extract_costs[i][q - 2][0] + \
-                                              self.table_build_extract_costs[i][q - 2][1]
+                extract_cost_lower_levels = self._extract_prefix[i]
+                build_extract_current_level = self.table_build_costs[i][q - 2] + self.table_extract_costs[i][q - 2]
                 cost = counter * (build_extract_current_level + extract_cost_lower_levels)
                 self.rebuild_costs[i] = cost
                 total_cost += cost
             else:
-                Q = T // (q ** (i + 1))  # full cycle.
-                r = (T % (q ** (i + 1))) // q ** i  # the reminder of cycles.
+                Q = T // self._q_pow[i + 1]  # full cycle.
+                r = (T % self._q_pow[i + 1]) // self._q_pow[i]  # the reminder of cycles.
                 full_cycle_cost = 0
                 remainder_cost = 0
-                extract_cost_current_level = 0
-                extract_cost_lower_levels = 0
-                build_current_level = 0
 
                 # Extraction cost of lower levels.
-                for j in range(i):
-                    extract_cost_lower_levels += self.table_build_extract_costs[j][q - 2][1]
+                extract_cost_lower_levels = self._extract_prefix[i]
 
                 if Q > 0:
                     # Building cost of current level after extraction.
-                    for j in range(self.q - 1):
-                        build_current_level += self.table_build_extract_costs[i][j][0]
+                    build_current_level = self._build_prefix[i][self.q - 1]
 
                     # Extraction cost of the current level.
-                    for j in range(self.q - 2):
-                        extract_cost_current_level += self.table_build_extract_costs[i][j][1]
+                    extract_cost_current_level = self._extract_level_prefix[i][self.q - 2]
 
                     full_cycle_cost = Q * (extract_cost_current_level + (
                             self.q - 1) * extract_cost_lower_levels + build_current_level)
@@ -190,29 +217,22 @@ class CounterMegaBlocksORAM:
                     remainder_cost = r * extract_cost_lower_levels
 
                     # The cost of the extraction
-                    for j in range(r - 1):
-                        remainder_cost += self.table_build_extract_costs[i][j][1]
+                    remainder_cost += self._extract_level_prefix[i][r - 1]
 
                     # The cost of build
-                    for j in range(r):
-                        remainder_cost += self.table_build_extract_costs[i][j][0]
+                    remainder_cost += self._build_prefix[i][r]
                 cost = full_cycle_cost + remainder_cost
                 self.rebuild_costs[i] = cost
                 total_cost += cost
         return total_cost
 
     def calc_build_extract_with_ht(self, n):
-        CounterRemoteRam.write_operations = 0
-        CounterRemoteRam.read_operations = 0
-        ht = HashTable(CounterRemoteRam(block_capacity=self.B, memory_size=math.ceil(n / self.B), local=False),
-                       self.B, n, False)
-        ht.ht_build()
-        build_cost = CounterRemoteRam.read_operations + CounterRemoteRam.write_operations
-        CounterRemoteRam.write_operations = 0
-        CounterRemoteRam.read_operations = 0
-        ht.ht_extract()
-        extract_cost = CounterRemoteRam.read_operations + CounterRemoteRam.write_operations
-        return build_cost, extract_cost
+        """
+        Returns the (build_cost, extract_cost) pair of a hash table holding n elements.
+
+        Levels of different sizes often share the same n, so the simulation is cached per (n, B).
+        """
+        return _build_extract_cost(n, self.B)
 
     def calc_total_cost(self):
         """
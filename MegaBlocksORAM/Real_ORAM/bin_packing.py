@@ -1,8 +1,33 @@
-import math
+import functools
 
 from RemoteRam.remote_ram import RemoteRam
-from config.constants import DUMMY
-from config.utils import is_dummy, get_msb_at_index, choose_C
+from config.constants import DUMMY, DUMMY_ADDR, BIN_INDEX_FIELD, BLOCK_INDEX_FIELD
+from config.utils import choose_C
+
+
+@functools.lru_cache(maxsize=None)
+def _bin_packing_indices(C):
+    """
+    Precomputes the access pattern of the bin packing network for C bins.
+
+    At level i, the j-th merge-split reads the cells j + j' and j + j' + 2^i, where j' = floor(j / 2^i) * 2^i.
+    The pattern depends only on C, so it is computed once and shared by all calls.
+
+    Parameters:
+      C (int): The number of bins (a power of 2).
+
+    Returns:
+      tuple: A pair (left, right); left[i][j] and right[i][j] are the indices of the two cells
+             read by the j-th merge-split at level i.
+    """
+    left = []
+    right = []
+    # C is a power of 2, so the network has log2(C) = (C - 1).bit_length() levels.
+    for i in range((C - 1).bit_length()):
+        step = 2 ** i
+        left.append(tuple(j + (j // step) * step for j in range(C // 2)))
+        right.append(tuple(j + (j // step) * step + step for j in range(C // 2)))
+    return tuple(left), tuple(right)
 
 
 def bin_packing(X, n, B, key_index, local=False):
@@ -24,28 +49,88 @@ def bin_packing(X, n, B, key_index, local=False):
     """
     # Determine the number of bins (C) and the number of levels (m)
     C = choose_C(n, B)
-    m = math.floor(math.log2(C)) + 1
-    # Create an array of RemoteRam instances for each level
-    a_arrays = [RemoteRam(B, C, local=local) for _ in range(m)]
-    a_arrays[0] = X  # The initial level is the input array X
+    # C is a power of 2: log2(C) is the bit length of C - 1 (and m = 1 when C = 1).
+    bit_length = (C - 1).bit_length()
+    m = bit_length + 1
+    # Level i + 1 only depends on level i, so two buffers are enough: the levels alternate between them.
+    # Every cell of a level is written before it is read, so the buffers are not filled with dummies.
+    buffers = [RemoteRam(B, C, memory=[None] * C, local=local) for _ in range(min(2, m - 1))]
+    current_level = X  # The initial level is the input array X
+
+    left, right = _bin_packing_indices(C)
 
     # Process each level to merge and split elements into bins
     for i in range(m - 1):
-        for j in range(C // 2):
-            # Compute the offset for current bin grouping based on level i
-            j_prime = math.floor(j / (2 ** i)) * (2 ** i)
-            # Read two adjacent cells from the current level
-            a_0 = a_arrays[i].read_memory_cell(j + j_prime)
-            a_1 = a_arrays[i].read_memory_cell(j + j_prime + 2 ** i)
-            # Merge and split the two cells into two new bins based on the (i+1)th MSB
-            b_0, b_1 = merge_split(a_0, a_1, i, B, (C - 1).bit_length(), key_index)
-            if b_0 != "Overflow":
-                a_arrays[i + 1].write_memory_cell(2 * j, b_0)
-                a_arrays[i + 1].write_memory_cell(2 * j + 1, b_1)
-            else:
-                raise Exception("Overflow on bin packing.")
+        next_level = buffers[i % 2]
+        # Every level reads and writes each of the C cells exactly once, so the I/O is accounted for
+        # per level and the merge-split network runs directly on the memory cells.
+        current_level.add_read_operations(C)
+        _merge_split_level(current_level.memory, next_level.memory, left[i], right[i], i, B, bit_length, key_index)
+        next_level.add_write_operations(C)
+        current_level = next_level
     # Return the final level containing the packed bins
-    return a_arrays[m - 1]
+    return current_level
+
+
+def bin_packing_by_key(X, n, B, local=False):
+    """
+    Bin packing that routes each element to the bin given by its bin index (used by HT.Build and compaction).
+
+    Parameters:
+      X (RemoteRam): The array to route; see bin_packing.
+      n (int): The total number of elements.
+      B (int): The block capacity.
+      local (bool): Flag indicating whether the memory used is local (default is False).
+
+    Returns:
+      RemoteRam: The elements of X placed into their destination bins.
+    """
+    return bin_packing(X, n, B, BIN_INDEX_FIELD, local)
+
+
+def bin_packing_by_block(X, n, B, local=False):
+    """
+    Bin packing that routes each element back to the block it came from (used by HT.Extract).
+
+    Parameters:
+      X (RemoteRam): The array to route; see bin_packing.
+      n (int): The total number of elements.
+      B (int): The block capacity.
+      local (bool): Flag indicating whether the memory used is local (default is False).
+
+    Returns:
+      RemoteRam: The elements of X placed back into their originating blocks.
+    """
+    return bin_packing(X, n, B, BLOCK_INDEX_FIELD, local)
+
+
+def _merge_split_level(cells, next_cells, left, right, i, B, bit_length, key_index):
+    """
+    Runs one level of the bin packing network on raw memory cells.
+
+    The j-th merge-split reads cells[left[j]] and cells[right[j]] and writes the two resulting bins to
+    next_cells[2j] and next_cells[2j + 1]. I/O accounting is left to the caller.
+
+    Parameters:
+      cells (list): The memory cells of level i.
+      next_cells (list): The memory cells of level i + 1 (overwritten).
+      left (tuple): The left cell index of each merge-split at this level.
+      right (tuple): The right cell index of each merge-split at this level.
+      i (int): Current level index.
+      B (int): The block capacity.
+      bit_length (int): The bit length used to represent the destination bin.
+      key_index (int): The index within an element where the destination bin is stored.
+
+    Raises:
+      Exception: If an overflow occurs during bin packing.
+    """
+    for j, (left_index, right_index) in enumerate(zip(left, right)):
+        # Merge and split the two cells into two new bins based on the (i+1)th MSB
+        b_0, b_1 = merge_split(cells[left_index], cells[right_index], i, B, bit_length, key_index)
+        if b_0 == "Overflow":
+            raise Exception("Overflow on bin packing.")
+        next_cells[2 * j] = b_0
+        next_cells[2 * j + 1] = b_1
 
 
 def merge_split(a_0, a_1, i, B, bit_length, key_index):
@@ -64,22 +149,13 @@ def merge_split(a_0, a_1, i, B, bit_length, key_index):
       tuple: Two lists, each representing a bin of size B (padded with dummies if necessary).
              Returns ("Overflow", "Overflow") if either bin exceeds capacity.
     """
-    b_0 = []
-    b_1 = []
-
-    # Process each element in both blocks
-    for j in range(B):
-        if not is_dummy(a_0[j]):
-            # Use the (i+1)th most significant bit to decide the bin
-            if get_msb_at_index(a_0[j][key_index], i + 1, bit_length) == 0:
-                b_0.append(a_0[j])
-            else:
-                b_1.append(a_0[j])
-        if not is_dummy(a_1[j]):
-            if get_msb_at_index(a_1[j][key_index], i + 1, bit_length) == 0:
-                b_0.append(a_1[j])
-            else:
-                b_1.append(a_1[j])
+    # The (i+1)th most significant bit of a bin index is the bit at position bit_length - i - 1 from the right.
+    shift = bit_length - i - 1
+
+    # Drop the dummies of both blocks in one pass, then partition the real elements by the selected bit
+    reals = [x for x in a_0 + a_1 if x[0] != DUMMY_ADDR]
+    b_0 = [x for x in reals if not (x[key_index] >> shift) & 1]
+    b_1 = [x for x in reals if (x[key_index] >> shift) & 1]
 
     # Check if any bin exceeds the capacity B
     if len(b_0) > B or len(b_1) > B:
@@ -1,13 +1,16 @@
-import hashlib
-import hmac
 import math
 import random
 import secrets
 
-from MegaBlocksORAM.Real_ORAM.bin_packing import bin_packing
+from Cryptodome.Cipher import AES
+
+from MegaBlocksORAM.Real_ORAM.bin_packing import bin_packing_by_key
 from RemoteRam.remote_ram import RemoteRam
 from config.constants import DUMMY, DUMMY_ADDR
-from config.utils import choose_C
+from config.utils import choose_C, prf_bin_indices
+
+# Dedicated generator for the (non-cryptographic) bin indices of dummy elements.
+_rng = random.Random()
 
 
 def compaction(X, n, B, n_0):
@@ -20,14 +23,14 @@ def compaction(X, n, B, n_0):
 
     Procedure:
       1. Process each block of X (of size B) by computing a randomized destination index for each element.
-         For non-dummy elements, the index is computed via HMAC (using a secret key); dummy elements (marked
-         with DUMMY_ADDR) are assigned a random index.
+         For non-dummy elements, the index is computed via a keyed PRF (AES with a secret key, evaluated once
+         per block); dummy elements (marked with DUMMY_ADDR) are assigned a random index.
       2. Each block is split into two halves, and each element is tagged with metadata (its current cell index
          and its position within the half).
       3. The processed blocks are stored in an intermediate array X_prime, padded with dummy blocks.
       4. The oblivious bin packing algorithm (bin_packing) routes the elements into destination bins.
-      5. Finally, the output array is constructed by sequentially reading bins from Y_buckets and packing the
-         non-dummy elements into blocks. Any remaining blocks in the output array are filled with dummy blocks.
+      5. Finally, the output array is constructed by reading all bins from Y_buckets, packing the non-dummy
+         elements into blocks in order and filling any remaining blocks with dummies.
 
     Parameters:
       X (RemoteRam): The input memory array containing the elements to be compacted.
@@ -39,72 +42,63 @@ def compaction(X, n, B, n_0):
       RemoteRam: A new memory array containing the compacted data in n_0/B blocks.
     """
     secret_key = secrets.token_bytes(32)
-    dummies = [DUMMY] * (B // 2)
+    cipher = AES.new(secret_key, AES.MODE_ECB, use_aesni=True)
+    half = B // 2
+    dummies = [DUMMY] * half
     size_of_compact_array = math.ceil(n_0 / B)
     size_of_X = math.ceil(n / B)
     C = choose_C(n, B)
 
-    # Create an intermediate memory array to store processed blocks.
-    X_prime = RemoteRam(memory_size=C, block_capacity=B)
+    # Create an intermediate memory array to store processed blocks. The first 2 * size_of_X cells are
+    # written below; the remaining cells are dummy blocks that are only read, so they share one list.
+    X_prime = RemoteRam(memory_size=C, block_capacity=B,
+                        memory=[None] * (2 * size_of_X) + [[DUMMY] * B] * (C - 2 * size_of_X))
 
-    # Process each block in X.
+    # Process each block in X. Every block of X is read and every cell of X_prime is written exactly once,
+    # so the I/O is accounted for in bulk and the cells are accessed directly.
+    X_cells = X.memory
+    X_prime_cells = X_prime.memory
     for i in range(size_of_X):
-        curr_cell = X.read_memory_cell(i)
-        for j in range(B):
-            if curr_cell[j][0] == DUMMY_ADDR:
-                # Assign a random bin index for dummy elements.
-                item_key = random.randint(0, C - 1)
-            else:
-                # Compute a keyed hash to obtain the bin index for real elements.
-                item_key = int.from_bytes(
-                    hmac.new(secret_key, str(curr_cell[j][0]).encode('utf-8'),
-                             hashlib.sha256).digest(),
-                    "big") % C
-            # Append the computed key to the element.
-            curr_cell[j] = curr_cell[j] + (item_key,)
-
-        # Split the block into two halves and tag each element.
-        first_half = [item + (2 * i, index) for index, item in enumerate(curr_cell[:B // 2])]
-        second_half = [item + (2 * i + 1, index) for index, item in enumerate(curr_cell[B // 2:])]
+        curr_cell = X_cells[i]
+        # Compute the keyed bin indices of all real elements in the block with a single PRF call.
+        real_addrs = [x[0] for x in curr_cell if x[0] != DUMMY_ADDR]
+        real_keys = iter(prf_bin_indices(cipher, real_addrs, C))
+        # Draw the random bin indices of all dummy elements in the block at once.
+        dummy_keys = iter(_rng.choices(range(C), k=B - len(real_addrs)))
+        item_keys = [next(dummy_keys) if x[0] == DUMMY_ADDR else next(real_keys) for x in curr_cell]
+
+        # Split the block into two halves and tag each element. Every element is built as a single flat
+        # tuple (k, v, bin index, cell index, position) and the input block itself is left untouched.
+        first_half = [(item[0], item[1], item_keys[index], 2 * i, index)
+                      for index, item in enumerate(curr_cell[:half])]
+        second_half = [(item[0], item[1], item_keys[half + index], 2 * i + 1, index)
+                       for index, item in enumerate(curr_cell[half:])]
 
         # Write the processed halves to X_prime, padding with dummies.
-        X_prime.write_memory_cell(2 * i, first_half + dummies)
-        X_prime.write_memory_cell(2 * i + 1, second_half + dummies)
+        X_prime_cells[2 * i] = first_half + dummies
+        X_prime_cells[2 * i + 1] = second_half + dummies
 
-    # Pad remaining cells in X_prime with dummy blocks.
-    for j in range(2 * size_of_X, C):
-        X_prime.write_memory_cell(j, [DUMMY] * B)
+    # Account for reading X and writing all C cells of X_prime (the remaining cells already hold dummy blocks).
+    X.add_read_operations(size_of_X)
+    X_prime.add_write_operations(C)
 
     # Obliviously route the elements into bins.
-    Y_buckets = bin_packing(X_prime, n, B, key_index=2)
-
-    # Create the output memory array for the compacted data.
-    new_array = RemoteRam(memory_size=size_of_compact_array, block_capacity=B)
-    curr_index = 0
-    curr_bin = 0
-    current_block = []
-
-    # Collect non-dummy elements from each bin in Y_buckets.
-    for i in range(C):
-        block_i = Y_buckets.read_memory_cell(i)
-        for j in range(B):
-            if block_i[j][0] != DUMMY_ADDR:
-                current_block.append((block_i[j][0], block_i[j][1]))
-                curr_index += 1
-                # If the block is full, write it to new_array.
-                if curr_index == B:
-                    new_array.write_memory_cell(curr_bin, current_block)
-                    curr_bin += 1
-                    curr_index = 0
-                    current_block = []
-
-    # Write any remaining elements to new_array and adjust its size.
-    if current_block and curr_index < B:
-        new_array.write_memory_cell(curr_bin, current_block + ([DUMMY] * (B - len(current_block))))
-        curr_bin += 1
-
-    # Fix: Fill any remaining blocks in new_array with dummy blocks.
-    for i in range(curr_bin, size_of_compact_array):
-        new_array.write_memory_cell(i, [DUMMY] * B)
+    Y_buckets = bin_packing_by_key(X_prime, n, B)
+
+    # Read every bin of Y_buckets and collect the (k, v) pairs of the non-dummy elements in a single pass.
+    Y_buckets.add_read_operations(C)
+    reals = [(item[0], item[1]) for block_i in Y_buckets.memory for item in block_i if item[0] != DUMMY_ADDR]
+    capacity = size_of_compact_array * B
+    if len(reals) > capacity:
+        raise Exception(f"Overflow on compaction. {len(reals)} real elements do not fit in {capacity} slots.")
+
+    # Pad with dummies and cut into blocks to form the output memory array, which is written once per block.
+    reals += [DUMMY] * (capacity - len(reals))
+    new_array = RemoteRam(
+        memory_size=size_of_compact_array,
+        block_capacity=B,
+        memory=[reals[i * B:(i + 1) * B] for i in range(size_of_compact_array)]
+    )
+    new_array.add_write_operations(size_of_compact_array)
 
     return new_array
@@ -1,13 +1,18 @@
 import math
-import hmac
-import hashlib
 import random
 import secrets
-from MegaBlocksORAM.Real_ORAM.bin_packing import bin_packing
-from config.constants import DUMMY, DUMMY_ADDR, ACCESSED_MARK
-from config.utils import choose_C
+from Cryptodome.Cipher import AES
+from MegaBlocksORAM.Real_ORAM.bin_packing import bin_packing_by_key, bin_packing_by_block
+from config.constants import DUMMY, DUMMY_ADDR, ACCESSED_MARK, BLOCK_INDEX_FIELD, POSITION_FIELD, ACCESSED_FIELD
+from config.utils import choose_C, prf_bin_indices
 from RemoteRam.remote_ram import RemoteRam
 
+# Dedicated generator for the (non-cryptographic) bin indices of dummy elements and dummy lookups.
+_rng = random.Random()
+
+# Tables with at most this many bins are extracted with one linear pass instead of the bin packing network.
+_LINEAR_EXTRACT_MAX_C = 4
+
 
 class HashTable:
     """
@@ -23,18 +28,43 @@ class HashTable:
       n (int): The total number of elements.
       local (bool): Flag indicating if the memory used is local. Default is False.
     """
+    __slots__ = ('is_built', 'X', 'n', 'B', 'C', 'secret_key', 'cipher', 'local', 'table')
+
     def __init__(self, X, B, n, local=False):
+        self.B = B
+        self.reset(X, n, local)
+
+    def reset(self, X, n, local=False):
+        """
+        Re-initializes the hash table in place for a new input array, so that a level can be rebuilt
+        without creating a new HashTable. A fresh PRF key is drawn.
+
+        Parameters:
+          X (RemoteRam): The new input memory array containing the items.
+          n (int): The total number of elements.
+          local (bool): Flag indicating if the memory used is local. Default is False.
+        """
         self.is_built = False
         self.X = X
         self.X.local = local
         self.n = n
-        self.B = B
         self.C = choose_C(self.n, self.B)  # Number of buckets (table size)
-        self.secret_key = secrets.token_bytes(32)  # 128-bit key for PRF
+        self.secret_key = secrets.token_bytes(32)  # 256-bit AES key for the PRF
+        # The key schedule is expanded once here and reused by every build and lookup.
+        self.cipher = AES.new(self.secret_key, AES.MODE_ECB, use_aesni=True)
         self.local = local
         # Initialize the hash table memory; note: if n is not divisible by B, rounding up may be needed.
         self.table = RemoteRam(block_capacity=self.B, memory_size=self.C, local=self.local)
 
+    def release(self):
+        """
+        Empties the hash table when its level is emptied, dropping the table and the input array so that
+        their memory is freed until the level is rebuilt with reset.
+        """
+        self.is_built = False
+        self.X = None
+        self.table = None
+
     def ht_build(self):
         """
         Builds the oblivious hash table (HT.Build(X)) as described in the paper.
@@ -42,45 +72,48 @@ class HashTable:
         Procedure:
           1. Process the input array X block by block. For each element in a block:
              - If the element is a dummy (identified by DUMMY_ADDR), assign a random bin index.
-             - Otherwise, compute the bin index using HMAC with a secret key.
-          2. Append the computed bin index to each element.
-          3. Split each block into two halves, tagging each element with its originating block index and position.
-          4. Write the processed halves into an intermediate array (X_prime), padding with dummies as needed.
-          5. Pad any remaining cells in X_prime.
-          6. Apply the oblivious bin packing algorithm (bin_packing) to route the elements into their destination bins.
-          7. Store the resulting packed bins in self.table and mark the hash table as built.
+             - Otherwise, compute the bin index with the keyed PRF (one AES call per block).
+          2. Split each block into two halves and build every element as one flat tuple holding its
+             (k, v) pair, bin index, originating block index and position.
+          3. Write the processed halves into an intermediate array (X_prime), padding with dummies as needed.
+          4. Account for the dummy padding of the remaining cells in X_prime.
+          5. Apply the oblivious bin packing algorithm (bin_packing) to route the elements into their destination bins.
+          6. Store the resulting packed bins in self.table and mark the hash table as built.
         """
         if self.C > 1:
             size_of_X = math.ceil(self.n / self.B)
-            dummies = [DUMMY] * (self.B // 2)
-            # Create an intermediate memory array X_prime with C blocks.
-            X_prime = RemoteRam(memory_size=self.C, block_capacity=self.B, local=self.local)
+            half = self.B // 2
+            dummies = [DUMMY] * half
+            # Create an intermediate memory array X_prime with C blocks. The first 2 * size_of_X cells are
+            # written below; the remaining cells are dummy blocks that are only read, so they share one list.
+            X_prime = RemoteRam(memory_size=self.C, block_capacity=self.B, local=self.local,
+                                memory=[None] * (2 * size_of_X) + [[DUMMY] * self.B] * (self.C - 2 * size_of_X))
+            # Every block of X is read and every cell of X_prime is written exactly once, so the I/O is
+            # accounted for in bulk and the cells are accessed directly.
+            X_cells = self.X.memory
+            X_prime_cells = X_prime.memory
             for i in range(size_of_X):
-                curr_cell = self.X.read_memory_cell(i)
-                # Process each element in the current block.
-                for j in range(self.B):
-                    if curr_cell[j][0] == DUMMY_ADDR:
-                        # Assign a random bin index for dummy elements.
-                        item_key = random.randint(0, self.C - 1)
-                    else:
-                        # For real elements, compute the bin index via HMAC.
-                        item_key = int.from_bytes(
-                            hmac.new(self.secret_key, str(curr_cell[j][0]).encode('utf-8'),
-                                     hashlib.sha256).digest(),
-                            "big") % self.C
-                    # Append the computed key to the element.
-                    curr_cell[j] = curr_cell[j] + (item_key,)
-                # Split the block into two halves; the additional tuple entries tag the element's source block and position.
-                first_half = [item + (2 * i, index) for index, item in enumerate(curr_cell[:self.B // 2])]
-                second_half = [item + (2 * i + 1, index) for index, item in enumerate(curr_cell[self.B // 2:])]
+                curr_cell = X_cells[i]
+                # For real elements, compute the bin indices of the whole block with a single PRF call.
+                real_addrs = [x[0] for x in curr_cell if x[0] != DUMMY_ADDR]
+                real_keys = iter(prf_bin_indices(self.cipher, real_addrs, self.C))
+                # Dummy elements get random bin indices, all drawn at once.
+                dummy_keys = iter(_rng.choices(range(self.C), k=self.B - len(real_addrs)))
+                item_keys = [next(dummy_keys) if x[0] == DUMMY_ADDR else next(real_keys) for x in curr_cell]
+                # Split the block into two halves. Each element is built as a single flat tuple
+                # (k, v, bin index, source block, position) without modifying the input block.
+                first_half = [(item[0], item[1], item_keys[index], 2 * i, index)
+                              for index, item in enumerate(curr_cell[:half])]
+                second_half = [(item[0], item[1], item_keys[half + index], 2 * i + 1, index)
+                               for index, item in enumerate(curr_cell[half:])]
                 # Write the processed halves to X_prime, padding with dummies.
-                X_prime.write_memory_cell(2 * i, first_half + dummies)
-                X_prime.write_memory_cell(2 * i + 1, second_half + dummies)
-            # Pad remaining cells in X_prime with dummy blocks.
-            for j in range(2 * size_of_X, self.C):
-                X_prime.write_memory_cell(j, [DUMMY for _ in range(self.B)])
+                X_prime_cells[2 * i] = first_half + dummies
+                X_prime_cells[2 * i + 1] = second_half + dummies
+            # Account for reading X and writing all C cells of X_prime (the remaining cells already hold dummy blocks).
+            self.X.add_read_operations(size_of_X)
+            X_prime.add_write_operations(self.C)
             # Apply oblivious bin packing to obtain the hash table.
-            self.table = bin_packing(X_prime, self.n, self.B, key_index=2, local=self.local)
+            self.table = bin_packing_by_key(X_prime, self.n, self.B, local=self.local)
         else:
             self.table = self.X
         self.is_built = True
@@ -91,7 +124,7 @@ class HashTable:
 
         Procedure:
           1. If k is a dummy key (DUMMY_ADDR), assign a random bin index.
-             Otherwise, compute the bin index using HMAC with the secret key.
+             Otherwise, compute the bin index using the keyed PRF with the secret key.
           2. Read the corresponding memory cell (bucket) from the hash table.
           3. Search the bucket for an element with key k.
              - If found, mark the element as accessed (by appending ACCESSED_MARK) and return its (k, v) pair.
@@ -105,11 +138,41 @@ class HashTable:
           The (k, v) pair if found; otherwise, a dummy element.
         """
         if k == DUMMY_ADDR:
-            item_key = random.randint(0, self.C - 1)
+            item_key = _rng.randrange(self.C)
         else:
-            item_key = int.from_bytes(
-                hmac.new(self.secret_key, str(k).encode('utf-8'), hashlib.sha256).digest(),
-                "big") % self.C
+            item_key = prf_bin_indices(self.cipher, [k], self.C)[0]
+        return self._lookup_in_bin(k, item_key)
+
+    def ht_lookup_batch(self, ks):
+        """
+        Performs ht_lookup for a sequence of keys.
+
+        The bin indices of all real keys are computed with a single PRF call; the bucket accesses are then
+        performed one after the other, in the order of ks, exactly as with repeated calls to ht_lookup.
+
+        Parameters:
+          ks (list): The keys to be looked up (dummy keys are DUMMY_ADDR).
+
+        Returns:
+          list: The result of each lookup, in order: the (k, v) pair if found; otherwise, a dummy element.
+        """
+        real_keys = iter(prf_bin_indices(self.cipher, [k for k in ks if k != DUMMY_ADDR], self.C))
+        item_keys = [_rng.randrange(self.C) if k == DUMMY_ADDR else next(real_keys) for k in ks]
+        return [self._lookup_in_bin(k, item_key) for k, item_key in zip(ks, item_keys)]
+
+    def _lookup_in_bin(self, k, item_key):
+        """
+        Reads bucket item_key, marks the element with key k as accessed and writes the bucket back.
+
+        The bucket is the table's own cell, so it is updated in place and the write back is only accounted for.
+
+        Parameters:
+          k: The key to be looked up.
+          item_key (int): The bin index of k.
+
+        Returns:
+          The (k, v) pair if found; otherwise, a dummy element.
+        """
         current_cell = self.table.read_memory_cell(item_key)
         item = None
         # Only search for real keys.
@@ -122,51 +185,97 @@ class HashTable:
                     break
         if not item:
             item = DUMMY
-        # Write the updated bucket back.
-        self.table.write_memory_cell(item_key, current_cell)
+        # Write the updated bucket back (it was modified in place).
+        self.table.add_write_operations(1)
         return item
 
     def ht_extract(self):
         """
         Extracts the original array from the hash table (HT.Extract()) as described in the paper.
 
-        Procedure:
-          1. If the hash table is not built, return the original input array X.
-          2. Otherwise, perform oblivious bin packing on self.table with a different key_index (3)
-             to reverse-route the elements.
-          3. Create a new memory array X_prime to store the reconstructed elements.
-          4. For each pair of buckets (2i and 2i+1) in the packed table:
-             - Read and optionally sort the buckets based on metadata (e.g., the original block index).
-             - For each element in the buckets, if it has been marked as accessed (ACCESSED_MARK), treat it as dummy.
-             - Otherwise, extract the (k, v) pair.
-          5. Write the reconstructed block to X_prime.
-          6. Adjust the size of X_prime to match ceil(n/B) and return it.
+        If the hash table is not built, the original input array X is returned. Otherwise the blocks are
+        reconstructed by ht_extract_into and returned in a new memory array.
 
         Returns:
           RemoteRam: The reconstructed memory array X_prime.
         """
         if not self.is_built:
             return self.X
+        blocks = []
+        self.ht_extract_into(blocks)
+        return RemoteRam(memory_size=len(blocks), block_capacity=self.B, memory=blocks, local=self.local)
+
+    def ht_extract_into(self, dst):
+        """
+        Performs HT.Extract() of a built hash table, appending the reconstructed blocks to dst instead of
+        materializing them in a separate memory array.
+
+        Procedure:
+          1. Small tables (C <= _LINEAR_EXTRACT_MAX_C) are extracted with _extract_linear instead.
+          2. Otherwise, perform oblivious bin packing on self.table by block index (bin_packing_by_block)
+             to reverse-route the elements.
+          3. For each pair of buckets (2i and 2i+1) in the packed table:
+             - Read the buckets and place each routed element in the slot of its original position;
+               padding dummies fill the slots in between.
+             - For each element in the buckets, if it has been marked as accessed (ACCESSED_MARK), treat it as dummy.
+             - Otherwise, extract the (k, v) pair.
+          4. Append the first ceil(n/B) reconstructed blocks to dst. All C/2 output blocks are accounted for.
+
+        Parameters:
+          dst (list): The list of memory cells the reconstructed blocks are appended to.
+        """
         if self.C == 1:
             self.table.memory = [[DUMMY if len(x) == 3 and x[2] == ACCESSED_MARK else x for x in self.table.memory[0]]]
-            return self.table
+            dst.extend(self.table.memory)
+            return
+        if self.C <= _LINEAR_EXTRACT_MAX_C:
+            self._extract_linear(dst)
+            return
         # Reverse the routing of the hash table using bin packing.
-        Y_buckets = bin_packing(self.table, self.n, self.B, 3, local=self.local)
-        X_prime = RemoteRam(memory_size=self.C // 2, block_capacity=self.B, local=self.local)
-        # Process each pair of buckets.
-        for i in range(self.C // 2):
-            Y_2i = Y_buckets.read_memory_cell(2 * i)
-            Y_2i_plus_one = Y_buckets.read_memory_cell(2 * i + 1)
-            # Sort the buckets by the extra metadata field if present (assumed to be at index 4).
-            Y_2i_plus_one.sort(key=lambda x: (0, x[4]) if len(x) > 4 else (1, 0))
-            Y_2i.sort(key=lambda x: (0, x[4]) if len(x) > 4 else (1, 0))
-            # Reconstruct the output block by taking at most B/2 real elements from each bucket.
-            X_prime_i = [DUMMY if len(x) > 5 and x[5] == ACCESSED_MARK else (x[0], x[1])
-                         for x in Y_2i[:self.B // 2]] + \
-                        [DUMMY if len(x) > 5 and x[5] == ACCESSED_MARK else (x[0], x[1])
-                         for x in Y_2i_plus_one[:self.B // 2]]
-            X_prime.write_memory_cell(i, X_prime_i)
-        # Adjust the memory size of X_prime to ceil(n/B)
-        X_prime.memory = X_prime.memory[:math.ceil(self.n / self.B)]
-        X_prime.memory_size = math.ceil(self.n / self.B)
-        return X_prime
+        Y_buckets = bin_packing_by_block(self.table, self.n, self.B, local=self.local)
+        half = self.B // 2
+        # Every bucket is read and every output block is written exactly once; account for the I/O in bulk.
+        Y_buckets.add_read_operations(self.C)
+        Y_buckets.add_write_operations(self.C // 2)
+        Y_cells = Y_buckets.memory
+        # Process each pair of buckets that holds one of the first ceil(n/B) blocks.
+        for i in range(min(self.C // 2, math.ceil(self.n / self.B))):
+            X_prime_i = []
+            for bucket in (Y_cells[2 * i], Y_cells[2 * i + 1]):
+                # The positions of the routed elements in a bucket are distinct, so each element is placed in
+                # the slot of its original position without a comparison sort. Padding dummies fill the slots
+                # in between, so the reals are not packed ahead of the dummies (merge_blocks and ht_build
+                # accept dummies anywhere in a block).
+                slots = [DUMMY] * self.B
+                for x in bucket:
+                    if len(x) > POSITION_FIELD:
+                        slots[x[POSITION_FIELD]] = x
+                # Reconstruct the output block by taking at most B/2 real elements from each bucket.
+                X_prime_i += [DUMMY if len(x) > ACCESSED_FIELD and x[ACCESSED_FIELD] == ACCESSED_MARK else (x[0], x[1])
+                              for x in slots[:half]]
+            dst.append(X_prime_i)
+
+    def _extract_linear(self, dst):
+        """
+        HT.Extract() for small tables: routes every element of the table back to its originating block in a
+        single pass over the table instead of running the bin packing network.
+
+        The I/O charged is identical to the bin packing extraction: log2(C) bin packing levels, each reading
+        and writing all C cells, followed by reading the C routed buckets and writing the C/2 output blocks.
+
+        Parameters:
+          dst (list): The list of memory cells the first ceil(n/B) reconstructed blocks are appended to.
+        """
+        half = self.B // 2
+        levels = (self.C - 1).bit_length()
+        self.table.add_read_operations((levels + 1) * self.C)
+        self.table.add_write_operations(levels * self.C + self.C // 2)
+        # Place every routed element at its original (block, position); padding dummies fill the rest.
+        blocks = [[DUMMY] * self.B for _ in range(self.C)]
+        for cell in self.table.memory:
+            for x in cell:
+                if len(x) > POSITION_FIELD:
+                    blocks[x[BLOCK_INDEX_FIELD]][x[POSITION_FIELD]] = x
+        dst.extend([DUMMY if len(x) > ACCESSED_FIELD and x[ACCESSED_FIELD] == ACCESSED_MARK else (x[0], x[1])
+                    for x in blocks[2 * i][:half] + blocks[2 * i + 1][:half]]
+                   for i in range(min(self.C // 2, math.ceil(self.n / self.B))))
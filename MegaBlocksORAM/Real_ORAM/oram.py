@@ -1,7 +1,7 @@
 import math
 from MegaBlocksORAM.Real_ORAM.compaction import compaction
 from MegaBlocksORAM.Real_ORAM.hash_table import HashTable
-from config.constants import DUMMY, READ_OPERATION
+from config.constants import DUMMY, DUMMY_ADDR, READ_OPERATION
 from RemoteRam.remote_ram import RemoteRam
 from config.utils import choose_C
 
@@ -17,34 +17,56 @@ class MegaBlocksORAM:
       q (int): The expansion factor for each level.
       local_memory_in_server_blocks (int): The amount of local memory available (in server blocks).
       amount_of_levels (int): The total number of levels in the ORAM hierarchy.
-      tables (list): A list of HashTable instances representing each level.
+      tables (list): A list of HashTable instances representing each level (None while a level is empty).
       inner_tables (list): A list of level indices that are maintained in local memory.
       load_factors (list): A list tracking the number of valid entries (load) at each level.
+      is_built (list): For each level, whether its hash table is currently built.
+      is_inner (list): For each level, whether it is maintained in local memory.
     """
 
+    __slots__ = ('N', 'B', 'q', 'curr', 'local_memory_in_server_blocks', 'amount_of_levels', '_q_pow', 'tables',
+                 'inner_tables', 'load_factors', 'is_built', 'is_inner', '_dummy_tail', '_first_nonfull',
+                 '_ht_sizes_by_load')
+
     def __init__(self, N, B, q, local_memory_in_server_blocks=2):
         self.N = N
         self.B = B
         self.q = q
         self.curr = None
         self.local_memory_in_server_blocks = local_memory_in_server_blocks
-        # Calculate the number of levels using log base q.
-        self.amount_of_levels = math.floor(math.log(self.N, q))
+        if q == 2:
+            # Binary hierarchy: the number of levels and the powers of q are exact bit operations.
+            self.amount_of_levels = self.N.bit_length() - 1
+            self._q_pow = [1 << i for i in range(self.amount_of_levels + 2)]
+        else:
+            # Calculate the number of levels using log base q.
+            self.amount_of_levels = math.floor(math.log(self.N, q))
+            # Integer powers of q (q^0 ... q^(amount_of_levels + 1)) used by the level size arithmetic.
+            self._q_pow = [q ** i for i in range(self.amount_of_levels + 2)]
         self.tables = []
         self.inner_tables = []
         # Determine which levels can reside in local memory.
         for i in range(self.amount_of_levels + 1):
-            if math.ceil((q ** i) * (q - 1) / B) < self.local_memory_in_server_blocks:
-                self.local_memory_in_server_blocks -= math.ceil((q ** i) * (q - 1) / B)
+            level_blocks = -(-self._q_pow[i] * (q - 1) // B)  # ceil(q^i * (q - 1) / B)
+            if level_blocks < self.local_memory_in_server_blocks:
+                self.local_memory_in_server_blocks -= level_blocks
                 self.inner_tables.append(i)
-        self.tables = [
-            HashTable(
-                RemoteRam(block_capacity=self.B, memory_size=0, local=(i in self.inner_tables)),
-                self.B, 0
-            ) for i in range(self.amount_of_levels + 1)
-        ]
+        # A level's hash table is only created when the level is first built and is reused by later rebuilds.
+        self.tables = [None] * (self.amount_of_levels + 1)
         # Initialize load factors for each level to zero.
         self.load_factors = [0] * (self.amount_of_levels + 1)
+        # Per-level flags, kept next to load_factors so that access does not query the HashTable objects.
+        self.is_built = [False] * (self.amount_of_levels + 1)
+        self.is_inner = [i in self.inner_tables for i in range(self.amount_of_levels + 1)]
+        # Dummy padding of the block holding the accessed element (immutable, shared by all accesses).
+        self._dummy_tail = (DUMMY,) * (self.B - 1)
+        # Index of the first level whose load factor is below q-1 (see find_ht_index).
+        self._first_nonfull = 0
+        # Size of every level for each possible load factor 0..q-1 (see calc_ht_size).
+        self._ht_sizes_by_load = [list(range(q))] + \
+                                 [[self._q_pow[i] * load_factor for load_factor in range(q)]
+                                  for i in range(1, self.amount_of_levels)] + \
+                                 [[self.N] * q]
         self.init_oram()
 
     def access(self, op, addr, data):
@@ -57,7 +79,7 @@ class MegaBlocksORAM:
           2. Dummy lookups are performed in levels that are not the source of the accessed data to hide the access pattern.
           3. A new element containing the updated (addr, data) pair is created in a local RemoteRam instance.
           4. The level index 'j' is determined as the first level with a load factor less than q - 1.
-          5. The new block is merged with data extracted from lower levels using concatenation (via RemoteRam.concat_memory_accesses).
+          5. The new block is merged with data extracted from lower levels (via HashTable.ht_extract_into).
           6. Depending on the level j:
              - For levels below the top, the hash table is rebuilt and its load factor is incremented.
              - For the highest level, if the level is full (load factor equals q - 1), compaction is performed.
@@ -71,22 +93,24 @@ class MegaBlocksORAM:
         Returns:
           The data retrieved from the ORAM (for a read), or the old data (for a write).
         """
-        found = False
-        data_star = DUMMY
-
-        # Search through each level for the element at 'addr'.
-        for i in range(self.amount_of_levels + 1):
-            if not found and self.load_factors[i] > 0:
-                fetched = self.tables[i].ht_lookup(addr)
+        tables = self.tables
+        load_factors = self.load_factors
+        levels = self.amount_of_levels + 1
+        data_star = 0
+
+        # Search the levels in order until the element at 'addr' is found.
+        i = 0
+        while i < levels:
+            if load_factors[i] > 0:
+                fetched = tables[i].ht_lookup(addr)
                 if fetched != DUMMY:
                     data_star = fetched
-                    found = True
-            elif self.load_factors[i] > 0:
-                # Perform dummy lookups in case the element was found.
-                self.tables[i].ht_lookup("_")
-
-        if not found:
-            data_star = 0
+                    break
+            i += 1
+        # Perform dummy lookups in the remaining levels once the element was found.
+        for k in range(i + 1, levels):
+            if load_factors[k] > 0:
+                tables[k].ht_lookup(DUMMY_ADDR)
 
         # Construct a new element with the relevant information.
         if op == READ_OPERATION:
@@ -97,40 +121,46 @@ class MegaBlocksORAM:
         # Find the first level with load factor less than q-1.
         j = self.find_ht_index()
 
-        # Create a local RemoteRam instance containing the new element, pad with dummies.
-        u = RemoteRam(self.B, 1, [[curr] + [DUMMY for _ in range(self.B -1)]], local=True)
+        # Merge the block of the new element (padded with dummies, kept locally) with the data extracted
+        # from levels 0..j. The extracted blocks are appended directly to the merged cells, except that level i
+        # is merged into the preceding block when calc_ht_size(i - 1) + calc_ht_size(i) <= B.
+        cells = [[curr, *self._dummy_tail]]
+        local = True
+        for i in range(j + 1):
+            if self.is_built[i]:
+                table = self.tables[i]
+                if self.calc_ht_size(i - 1) + self.calc_ht_size(i) <= self.B:
+                    extracted = []
+                    table.ht_extract_into(extracted)
+                    cells = [RemoteRam.merge_blocks(cells[0], extracted[0], self.B,
+                                                    self.calc_ht_size(i - 1), self.calc_ht_size(i))]
+                    local = True
+                else:
+                    table.ht_extract_into(cells)
+                    local = local and table.local
+        u = RemoteRam(self.B, len(cells), cells, local=local)
 
-        # Merge the new block (u) with the data extracted from levels.
         if j < self.amount_of_levels:
-            for i in range(j + 1):
-                if self.tables[i].is_built:
-                    u = RemoteRam.concat_memory_accesses(
-                        u, self.tables[i].ht_extract(),
-                        self.calc_ht_size(i - 1), self.calc_ht_size(i),
-                        self.B
-                    )
             self.load_factors[j] += 1
             # Rebuild the hash table at level j with the merged data.
-            self.tables[j] = HashTable(u, self.B, self.calc_ht_size(level_index=j), local=(j in self.inner_tables))
-            self.tables[j].ht_build()
-            self.reset_tables(0, j)
+            self.build_level(j, u, self.calc_ht_size(level_index=j), self.is_inner[j])
         else:
-            for i in range(j + 1):
-                if self.tables[i].is_built:
-                    u = RemoteRam.concat_memory_accesses(
-                        u, self.tables[i].ht_extract(),
-                        self.calc_ht_size(i - 1), self.calc_ht_size(i),
-                        self.B
-                    )
             # If the highest level is full, perform compaction.
             if self.load_factors[j] == self.q - 1:
                 u_prime = compaction(u, u.memory_size * self.B, self.B, self.N)
             else:
                 u_prime = u
-            self.tables[j] = HashTable(u_prime, self.B, u_prime.memory_size * self.B)
-            self.tables[j].ht_build()
-            self.reset_tables(0, j)
+            self.build_level(j, u_prime, u_prime.memory_size * self.B)
             self.load_factors[j] = self.q - 1
+        # Level j now holds the elements of levels 0..j-1, which are emptied. Their HashTable instances are
+        # kept (and reset when the level is rebuilt), but their tables and input arrays are released.
+        for table in self.tables[:j]:
+            table.release()
+        self.is_built[:j + 1] = [False] * j + [True]
+        self.load_factors[:j] = [0] * j
+        # Levels below j were emptied, so level 0 is the first non-full level unless it is j itself and
+        # has just become full; in that case the next non-full level is above it.
+        self._first_nonfull = 0 if self.load_factors[0] < self.q - 1 else self.scan_non_full_level(1)
 
         return data_star
 
@@ -138,30 +168,45 @@ class MegaBlocksORAM:
         """
         Finds the first level index where the load factor is less than q-1.
 
+        The index is maintained incrementally by access, so this is a constant-time lookup.
+
         Returns:
           int: The index of the level where the new data can be inserted. If all levels are full,
                returns the index corresponding to amount_of_levels (i.e., a new level).
         """
-        for index, load_factor in enumerate(self.load_factors):
-            if load_factor < self.q - 1:
+        return self._first_nonfull
+
+    def scan_non_full_level(self, start):
+        """
+        Scans the load factors for the first level, from start onwards, whose load factor is less than q-1.
+
+        Parameters:
+          start (int): The first level index to examine.
+
+        Returns:
+          int: The index of the first non-full level at or above start, or amount_of_levels if there is none.
+        """
+        for index in range(start, len(self.load_factors)):
+            if self.load_factors[index] < self.q - 1:
                 return index
         return self.amount_of_levels
 
-    def reset_tables(self, start, end):
+    def build_level(self, j, X, n, local=False):
         """
-        Resets the hash tables and load factors for levels in the range [start, end).
-
-        This method marks the specified tables as not built, clears their memory contents,
-        and resets their load factors to zero.
+        Builds the hash table of level j from X, reusing the level's HashTable instance if it has one.
 
         Parameters:
-          start (int): The starting level index (inclusive).
-          end (int): The ending level index (exclusive).
+          j (int): The level index.
+          X (RemoteRam): The memory array holding the elements of the level.
+          n (int): The number of elements of the level.
+          local (bool): Whether the level is kept in local memory.
         """
-        for i in range(start, end):
-            self.tables[i].is_built = False
-            self.tables[i].table = []
-            self.load_factors[i] = 0
+        table = self.tables[j]
+        if table is None:
+            self.tables[j] = table = HashTable(X, self.B, n, local=local)
+        else:
+            table.reset(X, n, local)
+        table.ht_build()
 
     def calc_ht_size(self, level_index):
         """
@@ -177,12 +222,10 @@ class MegaBlocksORAM:
         Returns:
           int: The calculated size of the specified level.
         """
-        if level_index == 0:
-            return self.load_factors[0]
-        elif level_index == self.amount_of_levels:
-            return self.N
-        else:
-            return math.ceil(int(math.pow(self.q, level_index) * self.load_factors[level_index]))
+        if level_index < 0:
+            # The level below level 0 (used when merging level 0) is always empty.
+            return 0
+        return self._ht_sizes_by_load[level_index][self.load_factors[level_index]]
 
     def init_oram(self):
         X = RemoteRam(block_capacity=self.B, memory_size=math.ceil(self.N / self.B))
@@ -190,5 +233,6 @@ class MegaBlocksORAM:
         self.tables[self.amount_of_levels] = HashTable(X=X, B=self.B, n=self.N)
         self.tables[self.amount_of_levels].ht_build()
         self.load_factors[self.amount_of_levels] = self.q - 1
+        self.is_built[self.amount_of_levels] = True
         RemoteRam.read_operations = 0
         RemoteRam.write_operations = 0
@@ -1,7 +1,28 @@
-import math
+import functools
 from RemoteRam.counter_remote_ram import CounterRemoteRam
 from config.utils import choose_C
 
+
+@functools.lru_cache(maxsize=None)
+def bin_packing_cost(n, B):
+    """
+    Computes the I/O of oblivious bin packing without simulating it.
+
+    With C = choose_C(n, B) bins, the network has log2(C) levels; at each level every one of the C // 2
+    merge-splits performs 2 reads and 2 writes. The result only depends on (n, B), so it is cached.
+
+    Parameters:
+      n (int): The total number of logical elements.
+      B (int): The block capacity (number of elements per block).
+
+    Returns:
+      tuple: The pair (reads, writes).
+    """
+    C = choose_C(n, B)
+    levels = (C - 1).bit_length()
+    return 2 * levels * (C // 2), 2 * levels * (C // 2)
+
+
 def bin_packing(X, n, B, key_index, local=False):
     """
     Implements oblivious bin packing for the counter ORAM.
@@ -20,15 +41,11 @@ def bin_packing(X, n, B, key_index, local=False):
       local (bool): If True, the memory is local and operations are not counted.
 
     Returns:
-      CounterRemoteRam: The final memory array after simulated bin packing.
+      tuple: The final memory array after simulated bin packing and the number of operations. The output has
+             the same shape as X (C cells), so X itself is returned instead of allocating a new instance.
     """
-    C = choose_C(n, B)
-    m = math.floor(math.log2(C)) + 1
-    a_arrays = [CounterRemoteRam(B, C, local=local) for _ in range(m)]
-    a_arrays[0] = X
+    reads, writes = bin_packing_cost(n, B)
     if not local:
-        # Simulate the read and write operations of the merge-split loop:
-        # Each of the (m-1) levels and for each j in range(C // 2) performs 2 reads and 2 writes.
-        CounterRemoteRam.write_operations += 2 * (m - 1) * (C // 2)
-        CounterRemoteRam.read_operations += 2 * (m - 1) * (C // 2)
-    return  a_arrays[m - 1], 4 * (m-1) * (C // 2)
+        CounterRemoteRam.write_operations += writes
+        CounterRemoteRam.read_operations += reads
+    return X, reads + writes
@@ -1,49 +1,50 @@
+import functools
 import math
-from MegaBlocksORAM.Simulation_ORAM.counter_bin_packing import bin_packing
+from MegaBlocksORAM.Simulation_ORAM.counter_bin_packing import bin_packing_cost
 from RemoteRam.counter_remote_ram import CounterRemoteRam
 from config.utils import choose_C
 
 
-def compaction(X, n, B, n_0):
+@functools.lru_cache(maxsize=None)
+def compaction_cost(n, B, n_0):
     """
-    Simulates the oblivious compaction procedure (as described in the paper) in the counter model.
+    Computes the I/O of the oblivious compaction procedure without simulating it.
 
     Parameters:
-      X (CounterRemoteRam): Input memory array.
       n (int): Total number of logical elements in X.
       B (int): Block capacity (number of elements per block).
       n_0 (int): Upper bound on the number of real elements in X (output array has size n_0/B blocks).
 
     Returns:
-      CounterRemoteRam: A new memory array representing the compacted output.
-
-    The function increments the CounterRemoteRam read and write counters to simulate the I/O overhead of the
-    real compaction procedure.
+      tuple: The pair (reads, writes).
     """
     size_of_X = math.ceil(n / B)
     C = choose_C(n, B)
     size_of_compact_array = math.ceil(n_0 / B)
+    bin_packing_reads, bin_packing_writes = bin_packing_cost(n, B)
+    # Reads: every input block, the bin packing and all C bins of its output.
+    # Writes: the C blocks of X_prime (two per input block plus dummy padding), the bin packing
+    # and the compacted output blocks.
+    return size_of_X + bin_packing_reads + C, C + bin_packing_writes + size_of_compact_array
 
-    # Create an intermediate memory instance.
-    X_prime = CounterRemoteRam(memory_size=C, block_capacity=B)
 
-    # Simulate the I/O of processing the input blocks:
-    CounterRemoteRam.write_operations += 2 * size_of_X  # Two writes per processed block.
-    CounterRemoteRam.read_operations += size_of_X  # One read per processed block.
-
-    # Simulate padding: writing remaining dummy blocks.
-    CounterRemoteRam.write_operations += (C - 2 * size_of_X)
-
-    # Perform oblivious bin packing, which itself increments counters.
-    Y_buckets = bin_packing(X_prime, n, B, key_index=2)
-
-    # Create the output memory instance.
-    new_array = CounterRemoteRam(memory_size=size_of_compact_array, block_capacity=B)
+def compaction(X, n, B, n_0):
+    """
+    Simulates the oblivious compaction procedure (as described in the paper) in the counter model.
 
-    # Simulate reading all blocks from the bin-packed output.
-    CounterRemoteRam.read_operations += C
+    Parameters:
+      X (CounterRemoteRam): Input memory array.
+      n (int): Total number of logical elements in X.
+      B (int): Block capacity (number of elements per block).
+      n_0 (int): Upper bound on the number of real elements in X (output array has size n_0/B blocks).
 
-    # Simulate writing the compacted output blocks.
-    CounterRemoteRam.write_operations += size_of_compact_array
+    Returns:
+      CounterRemoteRam: A new memory array representing the compacted output.
 
-    return new_array
+    The function increments the CounterRemoteRam read and write counters to simulate the I/O overhead of the
+    real compaction procedure (see compaction_cost).
+    """
+    reads, writes = compaction_cost(n, B, n_0)
+    CounterRemoteRam.read_operations += reads
+    CounterRemoteRam.write_operations += writes
+    return CounterRemoteRam(memory_size=math.ceil(n_0 / B), block_capacity=B)
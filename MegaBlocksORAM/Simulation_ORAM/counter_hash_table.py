@@ -1,10 +1,48 @@
+import functools
 import math
 import secrets
 from config.utils import choose_C
-from MegaBlocksORAM.Simulation_ORAM.counter_bin_packing import bin_packing
+from MegaBlocksORAM.Simulation_ORAM.counter_bin_packing import bin_packing_cost
 from RemoteRam.counter_remote_ram import CounterRemoteRam
 
 
+@functools.lru_cache(maxsize=None)
+def ht_build_cost(n, B):
+    """
+    Computes the I/O of building a hash table of n elements (HT.Build) without simulating it.
+
+    Parameters:
+      n (int): Total number of elements.
+      B (int): Block capacity (elements per block).
+
+    Returns:
+      tuple: The pair (reads, writes).
+    """
+    size_of_X = math.ceil(n / B)
+    C = choose_C(n, B)
+    bin_packing_reads, bin_packing_writes = bin_packing_cost(n, B)
+    # One read per input block, C writes to fill X_prime, then the bin packing.
+    return size_of_X + bin_packing_reads, C + bin_packing_writes
+
+
+@functools.lru_cache(maxsize=None)
+def ht_extract_cost(n, B):
+    """
+    Computes the I/O of extracting a built hash table of n elements (HT.Extract) without simulating it.
+
+    Parameters:
+      n (int): Total number of elements.
+      B (int): Block capacity (elements per block).
+
+    Returns:
+      tuple: The pair (reads, writes).
+    """
+    C = choose_C(n, B)
+    bin_packing_reads, bin_packing_writes = bin_packing_cost(n, B)
+    # The reverse bin packing, then reading all C buckets and writing C // 2 output blocks.
+    return bin_packing_reads + C, bin_packing_writes + C // 2
+
+
 class HashTable:
     """
     Counter version of an oblivious hash table (HT) for MegaBlocks ORAM.
@@ -14,6 +52,8 @@ class HashTable:
     I/O operations are simulated by incrementing CounterRemoteRam's counters.
     """
 
+    __slots__ = ('is_built', 'local', 'X', 'n', 'B', 'C', 'secret_key', 'table')
+
     def __init__(self, X, B, n, local=False):
         """
         Initializes the counter hash table.
@@ -24,16 +64,36 @@ class HashTable:
           data_size (int): Total number of elements.
           local (bool): If True, operations are local (not counted).
         """
+        self.B = B
+        self.reset(X, n, local)
+
+    def reset(self, X, n, local=False):
+        """
+        Re-initializes the counter hash table in place for a new input array (see HashTable.__init__).
+
+        Parameters:
+          X (CounterRemoteRam): The new input memory array.
+          n (int): Total number of elements.
+          local (bool): If True, operations are local (not counted).
+        """
         self.is_built = False
         self.local = local
         self.X = X
         self.X.local = local
         self.n = n
-        self.B = B
         self.C = choose_C(self.n, self.B)
         self.secret_key = secrets.token_bytes(32)
         self.table = CounterRemoteRam(block_capacity=self.B, memory_size=self.C, local=self.local)
 
+    def release(self):
+        """
+        Empties the hash table when its level is emptied, dropping the table and the input array so that
+        their memory is freed until the level is rebuilt with reset.
+        """
+        self.is_built = False
+        self.X = None
+        self.table = None
+
     def ht_build(self):
         """
         Simulates building the hash table (HT.Build) by incrementing I/O counters.
@@ -43,16 +103,12 @@ class HashTable:
           - Writing two cells per block (2 * size_of_X writes)
           - Writing dummy cells for the remaining cells up to C.
         Then it performs counter bin packing (using key_index=2) to form the table.
+        The counts are computed in closed form by ht_build_cost; the table keeps its C cells.
         """
-        counter = 0
         if not self.local:
-            size_of_X = math.ceil(self.n / self.B)
-            X_prime = CounterRemoteRam(memory_size=self.C, block_capacity=self.B, local=self.local)
-            CounterRemoteRam.read_operations += size_of_X
-            CounterRemoteRam.write_operations += self.C
-            counter += size_of_X + self.C
-            self.table, num = bin_packing(X_prime, self.n, self.B, key_index=2, local=self.local)
-            counter += num
+            reads, writes = ht_build_cost(self.n, self.B)
+            CounterRemoteRam.read_operations += reads
+            CounterRemoteRam.write_operations += writes
         self.is_built = True
 
     def ht_lookup(self, k):
@@ -60,32 +116,30 @@ class HashTable:
         Simulates a hash table lookup.
 
         For a lookup on key k, the function simulates a read and write on the table at index k.
+
+        Returns:
+          int: The number of counted I/O operations (0 for a local table, otherwise 2).
         """
-        counter = 0
-        if not self.local:
-            self.table.read_memory_cell(k)
-            self.table.write_memory_cell(k)
-            counter += 2
-        return counter
+        if self.local:
+            return 0
+        self.table.read_memory_cell(k)
+        self.table.write_memory_cell(k)
+        return 2
 
     def ht_extract(self):
         """
         Simulates extracting the original array from the hash table (HT.Extract).
 
         The table is reverse-routed using counter bin packing (with key_index=3), and the I/O counters
-        are incremented to reflect reading all cells and writing half as many cells.
+        are incremented to reflect reading all cells and writing half as many cells (see ht_extract_cost).
 
         Returns:
           CounterRemoteRam: A new memory instance with memory_size set to ceil(n/B).
         """
-        counter = 0
         if not self.is_built:
             return 0
-        Y_buckets, num = bin_packing(self.table, self.n, self.B, 3, local=self.local)
-        X_prime = CounterRemoteRam(memory_size=self.C // 2, block_capacity=self.B, local=self.local)
         if not self.local:
-            CounterRemoteRam.read_operations += self.C
-            CounterRemoteRam.write_operations += (self.C // 2)
-            counter += self.C + (self.C // 2) + num
-        X_prime.memory_size = math.ceil(self.n / self.B)
-        return X_prime
+            reads, writes = ht_extract_cost(self.n, self.B)
+            CounterRemoteRam.read_operations += reads
+            CounterRemoteRam.write_operations += writes
+        return CounterRemoteRam(memory_size=math.ceil(self.n / self.B), block_capacity=self.B, local=self.local)
@@ -14,6 +14,10 @@ class SimulationMegaBlocksORAM:
     The hierarchy is organized into levels based on expansion factor q.
     """
 
+    __slots__ = ('lookup_counter', 'extract_counter', 'build_counter', 'compaction_counter', 'N', 'B', 'q', 'curr',
+                 'local_memory_in_server_blocks', 'amount_of_levels', '_q_pow', 'tables', 'inner_tables',
+                 'load_factors', 'is_built', 'is_inner', '_first_nonfull', '_ht_sizes_by_load')
+
     def __init__(self, N, B, q, local_memory_in_server_blocks=2):
         """
         Initializes the ORAM with the given parameters.
@@ -33,21 +37,34 @@ class SimulationMegaBlocksORAM:
         self.q = q
         self.curr = None
         self.local_memory_in_server_blocks = local_memory_in_server_blocks
-        self.amount_of_levels = math.floor(math.log(self.N, q))
+        if q == 2:
+            # Binary hierarchy: the number of levels and the powers of q are exact bit operations.
+            self.amount_of_levels = self.N.bit_length() - 1
+            self._q_pow = [1 << i for i in range(self.amount_of_levels + 2)]
+        else:
+            self.amount_of_levels = math.floor(math.log(self.N, q))
+            # Integer powers of q (q^0 ... q^(amount_of_levels + 1)) used by the level size arithmetic.
+            self._q_pow = [q ** i for i in range(self.amount_of_levels + 2)]
         self.tables = []
         self.inner_tables = []
         for i in range(self.amount_of_levels + 1):
-            if math.ceil((q ** i) * (q - 1) / B) < self.local_memory_in_server_blocks:
-                self.local_memory_in_server_blocks -= math.ceil((q ** i) * (q - 1) / B)
+            level_blocks = -(-self._q_pow[i] * (q - 1) // B)  # ceil(q^i * (q - 1) / B)
+            if level_blocks < self.local_memory_in_server_blocks:
+                self.local_memory_in_server_blocks -= level_blocks
                 self.inner_tables.append(i)
-        self.tables = [
-            HashTable(
-                CounterRemoteRam(block_capacity=self.B, memory_size=0, local=(i in self.inner_tables)),
-                self.B, 0
-            )
-            for i in range(self.amount_of_levels + 1)
-        ]
+        # A level's hash table is only created when the level is first built and is reused by later rebuilds.
+        self.tables = [None] * (self.amount_of_levels + 1)
         self.load_factors = [0] * (self.amount_of_levels + 1)
+        # Per-level flags, kept next to load_factors so that access does not query the HashTable objects.
+        self.is_built = [False] * (self.amount_of_levels + 1)
+        self.is_inner = [i in self.inner_tables for i in range(self.amount_of_levels + 1)]
+        # Index of the first level whose load factor is below q-1 (see find_ht_index).
+        self._first_nonfull = 0
+        # Size of every level for each possible load factor 0..q-1 (see calc_ht_size).
+        self._ht_sizes_by_load = [list(range(q))] + \
+                                 [[self._q_pow[i] * load_factor for load_factor in range(q)]
+                                  for i in range(1, self.amount_of_levels)] + \
+                                 [[self.N] * q]
         self.init_oram()
 
     def access(self, op, addr, data):
@@ -66,61 +83,80 @@ class SimulationMegaBlocksORAM:
         Returns:
           The retrieved data (always DUMMY in this counter version).
         """
-        # Simulate lookup on each level to count I/O operations.
-        for i in range(self.amount_of_levels + 1):
-            if self.load_factors[i] > 0:
-               self.tables[i].ht_lookup(1)
+        # A lookup reads and writes one bucket in every non-empty level that is not kept locally
+        # (HashTable.ht_lookup), so the lookup phase is counted in one step.
+        lookups = sum(1 for load_factor, table in zip(self.load_factors, self.tables)
+                      if load_factor > 0 and not table.local)
+        CounterRemoteRam.read_operations += lookups
+        CounterRemoteRam.write_operations += lookups
         j = self.find_ht_index()
-        u = CounterRemoteRam(self.B, 1, local=True)
+        memories = [CounterRemoteRam(self.B, 1, local=True)]
+        capacities = []
+        for i in range(j + 1):
+            if self.is_built[i]:
+                memories.append(self.tables[i].ht_extract())
+                capacities.append((self.calc_ht_size(i - 1), self.calc_ht_size(i)))
+        u = CounterRemoteRam.concat_many(memories, capacities, self.B)
         if j < self.amount_of_levels:
-            for i in range(j + 1):
-                if self.tables[i].is_built:
-                    u = CounterRemoteRam.concat_memory_accesses(
-                        u, self.tables[i].ht_extract(),
-                        self.calc_ht_size(i - 1), self.calc_ht_size(i), self.B
-                    )
             self.load_factors[j] += 1
-            self.tables[j] = HashTable(u, self.B, self.calc_ht_size(level_index=j), local=(j in self.inner_tables))
-            self.tables[j].ht_build()
-            self.reset_tables(0, j)
+            self.build_level(j, u, self.calc_ht_size(level_index=j), self.is_inner[j])
         else:
-            for i in range(j + 1):
-                if self.tables[i].is_built:
-                    u = CounterRemoteRam.concat_memory_accesses(
-                        u, self.tables[i].ht_extract(),
-                        self.calc_ht_size(i - 1), self.calc_ht_size(i), self.B
-                    )
             u_prime = compaction(u, u.memory_size * self.B, self.B, self.N) if self.load_factors[j] == self.q - 1 else u
-            self.tables[j] = HashTable(u_prime, self.B, u_prime.memory_size * self.B)
-            self.tables[j].ht_build()
-            self.reset_tables(0, j)
+            self.build_level(j, u_prime, u_prime.memory_size * self.B)
             self.load_factors[j] = self.q - 1
+        # Level j now holds the elements of levels 0..j-1, which are emptied. Their HashTable instances are
+        # kept (and reset when the level is rebuilt), but their tables and input arrays are released.
+        for table in self.tables[:j]:
+            table.release()
+        self.is_built[:j + 1] = [False] * j + [True]
+        self.load_factors[:j] = [0] * j
+        # Levels below j were emptied, so level 0 is the first non-full level unless it is j itself and
+        # has just become full; in that case the next non-full level is above it.
+        self._first_nonfull = 0 if self.load_factors[0] < self.q - 1 else self.scan_non_full_level(1)
         return DUMMY
 
     def find_ht_index(self):
         """
         Finds the first level with load factor less than q-1.
 
+        The index is maintained incrementally by access, so this is a constant-time lookup.
+
         Returns:
           int: The index of the level where new data can be merged; if all are full, returns amount_of_levels.
         """
-        for index, load_factor in enumerate(self.load_factors):
-            if load_factor < self.q - 1:
+        return self._first_nonfull
+
+    def scan_non_full_level(self, start):
+        """
+        Scans the load factors for the first level, from start onwards, with load factor less than q-1.
+
+        Parameters:
+          start (int): The first level index to examine.
+
+        Returns:
+          int: The index of the first non-full level at or above start; if all are full, returns amount_of_levels.
+        """
+        for index in range(start, len(self.load_factors)):
+            if self.load_factors[index] < self.q - 1:
                 return index
         return self.amount_of_levels
 
-    def reset_tables(self, start, end):
+    def build_level(self, j, X, n, local=False):
         """
-        Resets the hash tables and load factors for levels in the range [start, end).
+        Builds the hash table of level j from X, reusing the level's HashTable instance if it has one.
 
         Parameters:
-          start (int): Starting level index (inclusive).
-          end (int): Ending level index (exclusive).
+          j (int): The level index.
+          X (CounterRemoteRam): The memory array holding the elements of the level.
+          n (int): The number of elements of the level.
+          local (bool): Whether the level is kept in local memory.
         """
-        for i in range(start, end):
-            self.tables[i].is_built = False
-            self.tables[i].table = []
-            self.load_factors[i] = 0
+        table = self.tables[j]
+        if table is None:
+            self.tables[j] = table = HashTable(X, self.B, n, local=local)
+        else:
+            table.reset(X, n, local)
+        table.ht_build()
 
     def calc_ht_size(self, level_index):
         """
@@ -135,17 +171,16 @@ class SimulationMegaBlocksORAM:
         Returns:
           int: The calculated size for that level.
         """
-        if level_index == 0:
-            return self.load_factors[0]
-        elif level_index == self.amount_of_levels:
-            return self.N
-        else:
-            return math.ceil(int(math.pow(self.q, level_index) * self.load_factors[level_index]))
+        if level_index < 0:
+            # The level below level 0 (used when merging level 0) is always empty.
+            return 0
+        return self._ht_sizes_by_load[level_index][self.load_factors[level_index]]
 
     def init_oram(self):
         X = CounterRemoteRam(block_capacity=self.B, memory_size=math.ceil(self.N / self.B))
         self.tables[self.amount_of_levels] = HashTable(X=X, B=self.B, n=self.N)
         self.tables[self.amount_of_levels].ht_build()
         self.load_factors[self.amount_of_levels] = self.q - 1
+        self.is_built[self.amount_of_levels] = True
         CounterRemoteRam.read_operations = 0
         CounterRemoteRam.write_operations = 0
\ No newline at end of file
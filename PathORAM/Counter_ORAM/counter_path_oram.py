@@ -38,10 +38,11 @@ class CounterPathORAM:
       stash (list): A temporary buffer used during data accesses.
     """
 
+    __slots__ = ('N', 'b', 'number_of_levels', 'Z', 'local_memory_capacity', 'local', 'pos_map', 'tree', 'stash')
+
     def __init__(self, N, b, Z, element_size, local_memory_capacity=2):
         self.N = N
         self.b = b  # Size of each server block (in bits).
-        self.number_of_levels = int(math.log(self.N, 2)) + 1
         self.Z = Z  # Bucket capacity.
         self.local_memory_capacity = local_memory_capacity
         self.local = False
@@ -50,7 +51,8 @@ class CounterPathORAM:
         # (saved as tree and position map for convenience); otherwise, use a recursive position map.
         if self.N < self.local_memory_capacity:
             self.N = next_power_of_two_greater_or_equal(N)
-            self.number_of_levels = int(math.log(self.N, 2)) + 1
+            # N is a power of 2, so log2(N) + 1 is exactly its bit length.
+            self.number_of_levels = self.N.bit_length()
             self.pos_map = CounterLocalPosPathORAM(N=self.N, b=self.b, Z=self.Z)
             self.tree = CounterRemoteRam(
                 memory_size=((2 * self.N) - 1) * self.Z,
@@ -60,13 +62,15 @@ class CounterPathORAM:
             self.local = True
         else:
             self.N = next_power_of_two_greater_or_equal(N)
-            self.number_of_levels = int(math.log(self.N, 2)) + 1
+            # N is a power of 2, so log2(N) + 1 is exactly its bit length.
+            self.number_of_levels = self.N.bit_length()
+            log_N = (self.N - 1).bit_length()  # log2(N), the size of a leaf label
             self.pos_map = CounterPathORAM(
-                N=math.ceil(self.N / (b // math.ceil(math.log(self.N, 2)))),
+                N=math.ceil(self.N / (b // log_N)),
                 b=self.b,
                 Z=self.Z,
                 local_memory_capacity=self.local_memory_capacity,
-                element_size=math.ceil(math.log(self.N, 2))
+                element_size=log_N
             )
             self.tree = CounterRemoteRam(
                 memory_size=((2 * self.N) - 1) * self.Z,
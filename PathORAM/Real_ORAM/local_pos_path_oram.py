@@ -3,15 +3,33 @@ import random
 
 from config.utils import next_power_of_two_greater_or_equal
 
+# Number of random leaves drawn at once by LocalPosPathORAM.
+LEAF_BUFFER_SIZE = 4096
+
 
 class LocalPosPathORAM:
+    __slots__ = ('N', 'B', 'Z', 'position_map', '_rng', '_leaf_range', '_leaves')
+
     def __init__(self, N, b, Z):
         self.N = N
         self.B = b
         self.Z = Z
-        self.position_map = {}
+        # Leaf of every address in [0, N); -1 marks an address that has not been mapped yet.
+        self.position_map = [-1] * self.N
+        self._rng = random.Random()
+        self._leaf_range = range(self.N)
+        # Buffer of pre-drawn random leaves, consumed from the end and refilled in one call when empty.
+        self._leaves = []
+
+    def _draw_leaf(self):
+        if not self._leaves:
+            self._leaves = self._rng.choices(self._leaf_range, k=LEAF_BUFFER_SIZE)
+        return self._leaves.pop()
 
     def pos_map_access(self, addr):
-        old_leaf = self.position_map[addr] if addr in self.position_map else random.randint(0, self.N - 1)
-        self.position_map[addr] = random.randint(0, self.N - 1)
-        return old_leaf, self.position_map[addr]
\ No newline at end of file
+        old_leaf = self.position_map[addr]
+        if old_leaf < 0:
+            old_leaf = self._draw_leaf()
+        new_leaf = self._draw_leaf()
+        self.position_map[addr] = new_leaf
+        return old_leaf, new_leaf
@@ -1,8 +1,8 @@
 import random
 import math
-from PathORAM.Real_ORAM.local_pos_path_oram import LocalPosPathORAM
+from PathORAM.Real_ORAM.local_pos_path_oram import LocalPosPathORAM, LEAF_BUFFER_SIZE
 from RemoteRam.remote_ram import RemoteRam
-from config.constants import WRITE_OPERATION, DUMMY
+from config.constants import WRITE_OPERATION, DUMMY, DUMMY_ADDR
 from config.utils import next_power_of_two_greater_or_equal
 
 
@@ -29,6 +29,10 @@ class PathORAM:
       upper_level_N (int): The number of elements for the upper-level position map (if any). Defaults to 0.
     """
 
+    __slots__ = ('N', 'b', 'B', 'upper_level_N', 'Z', 'local_memory_capacity', 'number_of_levels', 'pos_map', 'tree',
+                 'stash', '_path_shifts', '_bucket_padding', '_empty_bucket', '_pos_map_chain',
+                 '_local_pos_map', '_rng', '_upper_leaf_range', '_upper_leaves')
+
     def __init__(self, N, b, Z, element_size, local_memory_capacity=2, upper_level_N=0):
 
         self.N = N
@@ -37,35 +41,62 @@ class PathORAM:
         self.upper_level_N = upper_level_N
         self.Z = Z  # Bucket capacity.
         self.local_memory_capacity = local_memory_capacity
+        self._rng = random.Random()
+        self._upper_leaf_range = range(self.upper_level_N)
+        # Buffer of pre-drawn random upper-level leaves, consumed from the end and refilled in one call when empty.
+        self._upper_leaves = []
+
+        # Tree cells are only ever replaced as a whole (write_path), never modified in place, so the initially
+        # empty tree shares a single dummy block among all of its cells.
 
         # Decide whether to store the position map and tree locally or recursively.
         # If there is enough space in local memory (i.e. N is below the threshold),
         # the elements are stored locally (both the tree and the position map).
         if self.N < self.local_memory_capacity:
             self.N = next_power_of_two_greater_or_equal(self.N)
-            self.number_of_levels = int(math.log(self.N, 2)) + 1
+            # N is a power of 2, so log2(N) + 1 is exactly its bit length.
+            self.number_of_levels = self.N.bit_length()
             self.pos_map = LocalPosPathORAM(N=self.N, b=self.b, Z=self.Z)
             self.tree = RemoteRam(
                 memory_size=((2 * self.N) - 1) * self.Z,
                 block_capacity=self.B,
+                memory=[[DUMMY] * self.B] * (((2 * self.N) - 1) * self.Z),
                 local=True
             )
         else:
             self.N = next_power_of_two_greater_or_equal(self.N)
-            self.number_of_levels = int(math.log(self.N, 2)) + 1
+            # N is a power of 2, so log2(N) + 1 is exactly its bit length.
+            self.number_of_levels = self.N.bit_length()
+            log_N = (self.N - 1).bit_length()  # log2(N), the size of a leaf label
             self.pos_map = PathORAM(
-                N=math.ceil(self.N / (b // math.ceil(math.log(self.N, 2)))),
+                N=math.ceil(self.N / (b // log_N)),
                 b=self.b,
                 Z=self.Z,
-                element_size=math.ceil(math.log(self.N, 2)),
+                element_size=log_N,
                 local_memory_capacity=self.local_memory_capacity,
                 upper_level_N=self.N
             )
             self.tree = RemoteRam(
                 memory_size=((2 * self.N) - 1) * self.Z,
-                block_capacity=self.B
+                block_capacity=self.B,
+                memory=[[DUMMY] * self.B] * (((2 * self.N) - 1) * self.Z)
             )
-        self.stash = []  # Initialize the stash to temporarily hold blocks.
+        # The stash temporarily holds real blocks, keyed by address. Dicts preserve insertion order, which
+        # is the order the eviction fills buckets in; updating a block keeps its position.
+        self.stash = {}
+        # Right shifts of the leaf label that give the bucket of each level on a path, from the root down.
+        self._path_shifts = range(self.number_of_levels - 1, -1, -1)
+        # Z * B dummy entries, sliced to pad partially filled buckets.
+        self._bucket_padding = [DUMMY] * (self.Z * self.B)
+        # The Z dummy blocks of an empty bucket, written for every level no stash block is evicted to.
+        self._empty_bucket = self.split_and_pad_bucket([])
+        # The recursive position map levels below this ORAM, top down, and the local position map at the bottom.
+        if isinstance(self.pos_map, PathORAM):
+            self._pos_map_chain = [self.pos_map] + self.pos_map._pos_map_chain
+            self._local_pos_map = self.pos_map._local_pos_map
+        else:
+            self._pos_map_chain = []
+            self._local_pos_map = self.pos_map
 
     def access(self, op, addr, data):
         """
@@ -88,74 +119,163 @@ class PathORAM:
           The old data for a read operation, or None if the block was not found.
         """
         # Step 1: Obtain the old and new leaf labels by updating the position map.
-        old_leaf, new_leaf = self.pos_map.pos_map_access(addr)
+        old_leaf, new_leaf = self.pos_map_leaves(addr)
         result = None
 
-        # Step 2: Read the entire path corresponding to the old leaf.
-        path = self.read_path(old_leaf)
-
-        # Merge all blocks along the path into the stash.
-        for block in path:
-            self.stash.extend(block)
+        # Step 2: Read the entire path corresponding to the old leaf into the stash. The path is read and
+        # written back with the same leaf, so its cells are computed once.
+        cells = self.path_cell_indices(old_leaf)
+        self.read_path_into_stash(cells)
 
         # Step 3: Look for the block with the given address in the stash.
-        for i, element in enumerate(self.stash):
-            if element[0] == addr:
-                result = element[1]  # Retrieve the current data.
-                # Update data if this is a write, or keep the read result.
-                new_data = data if op == WRITE_OPERATION else result
-                self.stash[i] = (element[0], new_data, new_leaf)
-                break
-        # If writing and the block was not found, add a new block to the stash.
-        if op == WRITE_OPERATION and result is None:
-            self.stash.append((addr, data, new_leaf))
+        stash = self.stash
+        element = stash.get(addr)
+        if element is not None:
+            result = element[1]  # Retrieve the current data.
+            # Update data if this is a write, or keep the read result.
+            new_data = data if op == WRITE_OPERATION else result
+            stash[addr] = (addr, new_data, new_leaf)
+        elif op == WRITE_OPERATION:
+            # If writing and the block was not found, add a new block to the stash.
+            stash[addr] = (addr, data, new_leaf)
 
         # Step 4: Truncate the stash and write back blocks along the accessed path.
-        self.truncate_stash_and_write_back(old_leaf)
+        self.truncate_stash_and_write_back(old_leaf, cells)
         return result
 
+    def access_batch(self, requests):
+        """
+        Performs a batch of ORAM accesses with a single read and write back of the buckets they touch.
+
+        The leaf labels of all requests are obtained from the position map first. The union of the paths to
+        their old leaves is then read into the stash once (buckets shared by several paths, e.g. the root,
+        are read only once), the requests are served from the stash in order, and the stash is evicted into
+        the union of the paths, deepest bucket first, before all of its buckets are written back. The old
+        leaves are fresh random labels, so the number of buckets touched does not depend on the addresses.
+
+        Parameters:
+          requests (list): The accesses to perform, in order, as (op, addr, data) tuples.
+
+        Returns:
+          list: For each request, the value access would return for it.
+        """
+        leaves = [self.pos_map_leaves(addr) for _, addr, _ in requests]
+        Z = self.Z
+        # Heap indices of the buckets on the union of the paths (the root is 1, the children of k are 2k, 2k + 1).
+        buckets = sorted({(self.N + old_leaf) >> shift for old_leaf, _ in leaves for shift in self._path_shifts},
+                         reverse=True)
+        cells = [(bucket - 1) * Z + j for bucket in buckets for j in range(Z)]
+        self.read_path_into_stash(cells)
+        stash = self.stash
+
+        results = []
+        for (op, addr, data), (_, new_leaf) in zip(requests, leaves):
+            element = stash.get(addr)
+            result = None
+            if element is not None:
+                result = element[1]
+                stash[addr] = (addr, data if op == WRITE_OPERATION else result, new_leaf)
+            elif op == WRITE_OPERATION:
+                stash[addr] = (addr, data, new_leaf)
+            results.append(result)
+
+        # Evict deepest bucket first (larger heap indices are deeper): each bucket takes, in stash order, up to
+        # Z * B of the remaining blocks whose path goes through it.
+        L = self.number_of_levels
+        capacity = Z * self.B
+        remaining = list(stash.values())
+        write_back = []
+        for bucket in buckets:
+            shift = L - bucket.bit_length()
+            current_bucket = []
+            kept = []
+            for element in remaining:
+                if len(current_bucket) < capacity and (self.N + element[2]) >> shift == bucket:
+                    current_bucket.append(element)
+                else:
+                    kept.append(element)
+            remaining = kept
+            write_back += self.split_and_pad_bucket(current_bucket)
+        self.stash = {element[0]: element for element in remaining}
+        self.tree.write_memory_cells(cells, write_back)
+        return results
+
+    def pos_map_leaves(self, addr):
+        """
+        Obtains the old and new leaf labels of addr from the position map.
+
+        Instead of recursing through pos_map_access, the chain of recursive position map levels is walked
+        iteratively: the address looked up at every level is computed top down, the local position map at the
+        bottom is accessed, and then every level updates its mapping block bottom up.
+
+        Parameters:
+          addr: The logical address of the block.
+
+        Returns:
+          A tuple (old_leaf, new_leaf) of the leaf labels of addr.
+        """
+        addrs = [addr]
+        for pos_map in self._pos_map_chain:
+            addrs.append(addrs[-1] // pos_map.B)
+        old_leaf, new_leaf = self._local_pos_map.pos_map_access(addrs[-1])
+        for k in range(len(self._pos_map_chain) - 1, -1, -1):
+            old_leaf, new_leaf = self._pos_map_chain[k].update_pos_map_block(addrs[k], old_leaf, new_leaf)
+        return old_leaf, new_leaf
+
     def pos_map_access(self, upper_level_addr):
         """
-        Performs a recursive position map access for an upper-level address.
+        Performs a position map access for an upper-level address.
 
-        This method splits the upper-level address into a block index and an offset,
-        retrieves the corresponding mapping from the position map (stored in blocks),
-        updates the mapping, and integrates the retrieved blocks into the local stash.
-        Finally, it writes back the updated mapping along the accessed path.
+        Parameters:
+          upper_level_addr: The address within the upper-level (position map) space.
+
+        Returns:
+          A tuple (upper_level_old_leaf, upper_level_new_leaf) representing the old and new leaf labels for
+          the mapping entry.
+        """
+        old_leaf, new_leaf = self.pos_map_leaves(upper_level_addr // self.B)
+        return self.update_pos_map_block(upper_level_addr, old_leaf, new_leaf)
+
+    def update_pos_map_block(self, upper_level_addr, old_leaf, new_leaf):
+        """
+        Updates the mapping of an upper-level address, given the leaf labels of the block that holds it.
+
+        This method splits the upper-level address into a block index and an offset, reads the path of the
+        block's old leaf into the local stash, retrieves and updates the mapping in the block (which is moved
+        to new_leaf), and writes back the updated mapping along the accessed path.
 
         Parameters:
           upper_level_addr: The address within the upper-level (position map) space.
+          old_leaf (int): The current leaf label of the block holding the mapping.
+          new_leaf (int): The new leaf label of the block holding the mapping.
 
         Returns:
           A tuple (upper_level_old_leaf, upper_level_new_leaf) representing the old and new leaf labels for
           the mapping entry.
         """
-        pos_map_addr = int(upper_level_addr / self.B)
-        old_leaf, new_leaf = self.pos_map.pos_map_access(pos_map_addr)
-        path = self.read_path(old_leaf)
+        pos_map_addr, offset = divmod(upper_level_addr, self.B)
+        cells = self.path_cell_indices(old_leaf)
+        self.read_path_into_stash(cells)
         upper_level_old_leaf = None
         upper_level_new_leaf = None
 
-        for block in path:
-            self.stash.extend(block)
-
-        for i, element in enumerate(self.stash):
-            if element[0] == pos_map_addr:
-                addr_list = element[1]
-                upper_level_old_leaf = addr_list[upper_level_addr % self.B]
-                upper_level_new_leaf = self.generate_random_upper_leaf()
-                addr_list[upper_level_addr % self.B] = upper_level_new_leaf
-                self.stash[i] = (pos_map_addr, addr_list, new_leaf)
-
-        if upper_level_old_leaf is None:
-            pos_list = [self.generate_random_upper_leaf() for _ in range(self.B)]
+        stash = self.stash
+        element = stash.get(pos_map_addr)
+        if element is not None:
+            addr_list = element[1]
+            upper_level_old_leaf = addr_list[offset]
             upper_level_new_leaf = self.generate_random_upper_leaf()
-            pos_list[upper_level_addr % self.B] = upper_level_new_leaf
-            upper_level_old_leaf = self.generate_random_upper_leaf()
-            element = (pos_map_addr, pos_list, new_leaf)
-            self.stash.append(element)
-
-        self.truncate_stash_and_write_back(old_leaf)
+            addr_list[offset] = upper_level_new_leaf
+            stash[pos_map_addr] = (pos_map_addr, addr_list, new_leaf)
+        else:
+            draw_leaf = self.generate_random_upper_leaf
+            pos_list = [draw_leaf() for _ in range(self.B)]
+            upper_level_new_leaf = draw_leaf()
+            pos_list[offset] = upper_level_new_leaf
+            upper_level_old_leaf = draw_leaf()
+            stash[pos_map_addr] = (pos_map_addr, pos_list, new_leaf)
+
+        self.truncate_stash_and_write_back(old_leaf, cells)
         return upper_level_old_leaf, upper_level_new_leaf
 
     def split_and_pad_bucket(self, bucket):
@@ -172,55 +292,58 @@ class PathORAM:
         Returns:
           A list of Z blocks (each of fixed size B).
         """
-        blocks = []
-        if len(bucket) < self.Z * self.B:
-            bucket = bucket + [DUMMY for _ in range(self.Z * self.B - len(bucket))]
-        for i in range(self.Z):
-            blocks.append(bucket[i * self.B: (i + 1) * self.B])
-        return blocks
-
-    def read_path(self, leaf):
+        B = self.B
+        padding = self._bucket_padding
+        if len(bucket) < len(padding):
+            bucket = bucket + padding[len(bucket):]
+        return [bucket[i:i + B] for i in range(0, len(padding), B)]
+
+    def path_cell_indices(self, leaf):
         """
-        Reads all buckets along the path from the root of the ORAM tree to a given leaf.
+        Computes the memory cells of all buckets along the path from the root of the ORAM tree to a given leaf.
 
-        For a complete binary tree with 'number_of_levels' levels (level 0 is the root, level L-1 are leaves),
-        the path is determined by the binary representation of the leaf label.
+        The buckets are numbered level by level (the root is 0), so the bucket at level i on the path to
+        leaf is ((N + leaf) >> (L - 1 - i)) - 1, where N = 2^(L-1) is the number of leaves. Bucket k
+        occupies the Z cells starting at k * Z.
+
+        Parameters:
+          leaf (int): The leaf label that identifies the path.
 
         Returns:
-          A list of all blocks read from the buckets along the path.
+          tuple: The L * Z cell indices of the path, from the root down.
         """
-        path = []
-        L = self.number_of_levels
-        for i in range(L):
-            starting_index = (2 ** i - 1) * self.Z
-            bucket_index = leaf >> (L - 1 - i)
-            base_index = starting_index + bucket_index * self.Z
-            for j in range(self.Z):
-                cell_index = base_index + j
-                if cell_index >= ((2 * self.N) - 1) * self.Z:
-                    a= 1
-                path.append(self.tree.read_memory_cell(cell_index))
-        return path
-
-    def write_path(self, buckets, leaf):
+        Z = self.Z
+        heap_index = self.N + leaf
+        return tuple(((heap_index >> shift) - 1) * Z + j for shift in self._path_shifts for j in range(Z))
+
+    def read_path_into_stash(self, cells):
+        """
+        Reads all buckets along a path from the root of the ORAM tree to a leaf and merges their real blocks
+        directly into the stash.
+
+        The L * Z cells of the path are read with a single read_memory_cells call, which checks their bounds
+        and accounts for the reads at once.
+
+        Parameters:
+          cells (tuple): The cell indices of the path (see path_cell_indices), or of a union of paths.
+        """
+        stash = self.stash
+        for cell in self.tree.read_memory_cells(cells):
+            for element in cell:
+                if element[0] != DUMMY_ADDR:
+                    stash[element[0]] = element
+
+    def write_path(self, buckets, cells):
         """
         Writes a series of buckets back to the remote memory along the path from the root to a given leaf.
 
-        For each level in the ORAM tree, this method computes the appropriate memory cell indices based on
-        the leaf label and writes the corresponding bucket blocks.
+        The blocks of the buckets, from the root down, are written to the cells of the path.
 
         Parameters:
           buckets (list): A list of buckets (each a list of blocks) indexed by level.
-          leaf (int): The leaf label that identifies the path.
+          cells (tuple): The cell indices of the path (see path_cell_indices).
         """
-        L = self.number_of_levels
-        for i in range(L):
-            starting_index = (2 ** i - 1) * self.Z
-            bucket_index = leaf >> (L - 1 - i)
-            base_index = starting_index + bucket_index * self.Z
-            for j in range(self.Z):
-                cell_index = base_index + j
-                self.tree.write_memory_cell(cell_index, buckets[i][j])
+        self.tree.write_memory_cells(cells, [block for bucket in buckets for block in bucket])
 
     def generate_random_upper_leaf(self):
         """
@@ -229,31 +352,45 @@ class PathORAM:
         Returns:
           An integer selected uniformly at random from the range [0, upper_level_N).
         """
-        return random.randint(0, self.upper_level_N - 1)
+        if not self._upper_leaves:
+            self._upper_leaves = self._rng.choices(self._upper_leaf_range, k=LEAF_BUFFER_SIZE)
+        return self._upper_leaves.pop()
 
-    def truncate_stash_and_write_back(self, old_leaf):
+    def truncate_stash_and_write_back(self, old_leaf, cells):
         """
         Evicts blocks from the stash along the path corresponding to the provided leaf.
 
-        This method scans the stash for blocks whose assigned leaf matches the prefix of old_leaf
-        (determined per level), groups them into buckets, pads the buckets to a fixed size, and writes
-        the resulting buckets back to remote memory along the same path.
+        The path of a block's leaf shares with the path of old_leaf exactly the buckets above the highest bit in
+        which the two leaves differ, so the deepest level each block may be placed at is computed once with an XOR.
+        The levels are then filled from the root down: each bucket takes, in stash order, up to Z * B of the
+        remaining blocks that may reside at its level. The buckets are padded to a fixed size and written back
+        to remote memory along the same path.
 
         Parameters:
           old_leaf (int): The leaf label used to identify the path for eviction.
+          cells (tuple): The cell indices of that path (see path_cell_indices).
         """
+        L = self.number_of_levels
+        capacity = self.Z * self.B
+        stash = list(self.stash.values())
+        # The deepest level of the path each stash block may reside at. Every leaf is below 2^(L-1), so every
+        # block may reside at the root. Blocks are referred to by their stash position.
+        depth = [L - 1 - (element[2] ^ old_leaf).bit_length() for element in stash]
+        remaining = list(range(len(stash)))
+        left_over = []
         write_back = []
-        for i in range(self.number_of_levels):
-            current_bucket = []
-            # Iterate over a copy of the stash to safely remove eligible blocks.
-            for element in list(self.stash):
-                if element == DUMMY:
-                    self.stash.remove(element)
-                elif element != DUMMY and (element[2] >> (self.number_of_levels - 1 - i)) == (
-                        old_leaf >> (self.number_of_levels - 1 - i)):
-                    current_bucket.append(element)
-                    self.stash.remove(element)
-                    if len(current_bucket) == self.Z * self.B:
-                        break
-            write_back.append(self.split_and_pad_bucket(current_bucket))
-        self.write_path(write_back, old_leaf)
+        split_and_pad_bucket = self.split_and_pad_bucket
+        for i in range(L):
+            if not remaining:
+                # The buckets of the remaining levels are empty.
+                write_back += [self._empty_bucket] * (L - i)
+                break
+            # All remaining blocks may reside at level i, so the bucket is simply the first Z * B of them.
+            write_back.append(split_and_pad_bucket([stash[index] for index in remaining[:capacity]]))
+            # Blocks that cannot go below level i stay in the stash.
+            rest = remaining[capacity:]
+            left_over += [index for index in rest if depth[index] == i]
+            remaining = [index for index in rest if depth[index] > i]
+        left_over.sort()
+        self.stash = {stash[index][0]: stash[index] for index in left_over}
+        self.write_path(write_back, cells)
@@ -34,7 +34,7 @@ class CounterRemoteRam:
         Raises:
           Exception: If the location is invalid.
         """
-        if location > self.memory_size * self.block_capacity - 1 or location < 0:
+        if not 0 <= location < self.memory_size * self.block_capacity:
             raise Exception(
                 f"Invalid attempt to read memory cell. Index value is {location}, memory size is {self.memory_size}")
         if not self.local:
@@ -51,7 +51,7 @@ class CounterRemoteRam:
         Raises:
           Exception: If the location is invalid.
         """
-        if location > self.memory_size * self.block_capacity - 1 or location < 0:
+        if not 0 <= location < self.memory_size * self.block_capacity:
             raise Exception(
                 f"Invalid attempt to write memory cell. Index value is {location}, memory size is {self.memory_size}")
         if not self.local:
@@ -108,3 +108,26 @@ class CounterRemoteRam:
             return CounterRemoteRam(block_capacity=block_size, memory_size=1)
         else:
             return mem1 + mem2
+
+    @staticmethod
+    def concat_many(memories, capacities, block_size):
+        """
+        Concatenates a sequence of CounterRemoteRam instances in a single pass.
+
+        Equivalent to folding concat_memory_accesses from left to right with capacities[k] used when
+        merging memories[k + 1], without creating an intermediate instance per step.
+
+        Parameters:
+          memories (list): The CounterRemoteRam instances to concatenate, in order.
+          capacities (list): For each memories[k + 1], the pair (capacity1, capacity2).
+          block_size (int): The block size.
+
+        Returns:
+          CounterRemoteRam: The concatenated memory instance.
+        """
+        if len(memories) == 1:
+            return memories[0]
+        memory_size = memories[0].memory_size
+        for mem, (capacity1, capacity2) in zip(memories[1:], capacities):
+            memory_size = 1 if (capacity1 + capacity2) <= block_size else memory_size + mem.memory_size
+        return CounterRemoteRam(block_capacity=block_size, memory_size=memory_size)
@@ -43,6 +43,9 @@ class RemoteRam:
         """
         Reads the memory cell (block) at the specified location.
 
+        The stored cell itself is returned, not a copy: a caller that modifies it in place only needs to
+        account for the write (add_write_operations) instead of writing the cell back.
+
         Parameters:
           location (int): The index of the memory cell to read.
 
@@ -52,7 +55,7 @@ class RemoteRam:
         Raises:
           Exception: If the location is out of bounds.
         """
-        if location > len(self.memory) - 1 or location < 0:
+        if not 0 <= location < len(self.memory):
             raise Exception(f"Invalid attempt to read memory cell. Index value is {location}, memory size is {self.memory_size}")
         if not self.local:
             RemoteRam.read_operations += 1
@@ -69,12 +72,73 @@ class RemoteRam:
         Raises:
           Exception: If the location is out of bounds.
         """
-        if location > len(self.memory) - 1 or location < 0:
+        if not 0 <= location < len(self.memory):
             raise Exception(f"Invalid attempt to write memory cell. Index value is {location}, memory size is {self.memory_size}")
         if not self.local:
             RemoteRam.write_operations += 1
         self.memory[location] = element
 
+    def read_memory_cells(self, locations):
+        """
+        Reads the memory cells (blocks) at the specified locations, e.g. a whole Path ORAM path.
+
+        Like read_memory_cell, the stored cells themselves are returned, not copies.
+
+        Parameters:
+          locations (list): The indices of the memory cells to read.
+
+        Returns:
+          list: The contents of the memory cells, in the order of locations.
+
+        Raises:
+          Exception: If a location is out of bounds.
+        """
+        if locations and (max(locations) > len(self.memory) - 1 or min(locations) < 0):
+            raise Exception(f"Invalid attempt to read memory cells. Index values are {min(locations)}..{max(locations)}, memory size is {self.memory_size}")
+        if not self.local:
+            RemoteRam.read_operations += len(locations)
+        memory = self.memory
+        return [memory[location] for location in locations]
+
+    def write_memory_cells(self, locations, elements):
+        """
+        Writes the given elements to the memory cells at the specified locations.
+
+        Parameters:
+          locations (list): The indices of the memory cells to write to.
+          elements (list): The elements (typically blocks of data) to write, one per location.
+
+        Raises:
+          Exception: If a location is out of bounds.
+        """
+        if locations and (max(locations) > len(self.memory) - 1 or min(locations) < 0):
+            raise Exception(f"Invalid attempt to write memory cells. Index values are {min(locations)}..{max(locations)}, memory size is {self.memory_size}")
+        if not self.local:
+            RemoteRam.write_operations += len(locations)
+        memory = self.memory
+        for location, element in zip(locations, elements):
+            memory[location] = element
+
+    def add_read_operations(self, num_operations):
+        """
+        Accounts for a number of memory cells read in bulk (e.g. a full scan of the memory).
+
+        Parameters:
+          num_operations (int): The number of read operations to add.
+        """
+        if not self.local:
+            RemoteRam.read_operations += num_operations
+
+    def add_write_operations(self, num_operations):
+        """
+        Accounts for a number of memory cells written in bulk (e.g. a memory built in one pass).
+
+        Parameters:
+          num_operations (int): The number of write operations to add.
+        """
+        if not self.local:
+            RemoteRam.write_operations += num_operations
+
     def init_memory(self):
         """
         Initializes the memory with a mix of real and dummy elements.
@@ -85,12 +149,8 @@ class RemoteRam:
         Parameters:
           real_elements (int): The total number of real elements to initialize in memory.
         """
-        for i in range(self.memory_size):
-            block_i = []
-            for j in range(self.block_capacity):
-                data = "d" + str(i * self.block_capacity + j)
-                block_i.append((i * self.block_capacity + j, data))
-            self.memory[i] = block_i
+        B = self.block_capacity
+        self.memory = [[(k, "d" + str(k)) for k in range(i * B, (i + 1) * B)] for i in range(self.memory_size)]
 
     def __add__(self, other):
         """
@@ -107,39 +167,6 @@ class RemoteRam:
         """
         return RemoteRam(self.block_capacity, self.memory_size + other.memory_size, self.memory + other.memory)
 
-    @staticmethod
-    def concat_memory_accesses(mem1, mem2, capacity1, capacity2, block_size):
-        """
-        Concatenates the memory accesses of two RemoteRam instances.
-
-        If the sum of capacities (capacity1 + capacity2) is less than or equal to the block_size,
-        then the blocks are merged into one using merge_blocks. Otherwise, the memory arrays are simply concatenated.
-
-        Parameters:
-          mem1 (RemoteRam): The first memory instance.
-          mem2 (RemoteRam): The second memory instance.
-          capacity1 (int): The effective capacity used in mem1.
-          capacity2 (int): The effective capacity used in mem2.
-          block_size (int): The size of a block.
-
-        Returns:
-          RemoteRam: A new RemoteRam instance representing the concatenated result.
-        """
-        if (capacity1 + capacity2) <= block_size:
-            return RemoteRam(
-                block_capacity=block_size,
-                memory_size=1,
-                memory=[RemoteRam.merge_blocks(mem1.memory[0], mem2.memory[0], block_size, capacity1, capacity2)],
-                local=True
-            )
-        else:
-            return RemoteRam(
-                block_capacity=block_size,
-                memory_size=mem1.memory_size + mem2.memory_size,
-                memory=mem1.memory + mem2.memory,
-                local=mem1.local and mem2.local
-            )
-
     @staticmethod
     def merge_blocks(block1, block2, block_capacity, capacity1, capacity2):
         """
@@ -158,11 +185,7 @@ class RemoteRam:
         Returns:
           list: The merged block of data, padded with dummy entries.
         """
-        new_block = []
-        for i in range(block_capacity):
-            if block1[i][0] != DUMMY_ADDR:
-                new_block.append(block1[i])
-            if block2[i][0] != DUMMY_ADDR:
-                new_block.append(block2[i])
+        new_block = [item for pair in zip(block1[:block_capacity], block2[:block_capacity]) for item in pair
+                     if item[0] != DUMMY_ADDR]
         # Pad the block with dummy entries if necessary.
         return new_block + [DUMMY] * (block_capacity - len(new_block))
@@ -1,9 +1,16 @@
-DUMMY_ADDR = "_"
+# Address of dummy elements. Real addresses are non-negative integers.
+DUMMY_ADDR = -1
 READ_OPERATION = "Read"
 WRITE_OPERATION = "Write"
 ACCESSED_MARK = "Accessed"
 DUMMY = (DUMMY_ADDR, 0)
 
+# Field indices of an element routed by MegaBlocks: (k, v, bin index, block index, position[, ACCESSED_MARK])
+BIN_INDEX_FIELD = 2
+BLOCK_INDEX_FIELD = 3
+POSITION_FIELD = 4
+ACCESSED_FIELD = 5
+
 # ORAM choice constants
 SIMULATION_MEGA_BLOCKS_ORAM = '1'
 MEGA_BLOCKS_ORAM = '2'
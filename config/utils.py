@@ -1,6 +1,9 @@
+import contextlib
+import functools
 import math
 import random
 import string
+import struct
 
 from FutORAMa.Counter_ORAM.local_RAM import local_RAM
 from RemoteRam.counter_remote_ram import CounterRemoteRam
@@ -8,36 +11,6 @@ from RemoteRam.remote_ram import RemoteRam
 from config.constants import DUMMY_ADDR
 
 
-def get_msb_at_index(x, i, bit_length):
-    """
-    Returns the i-th most significant bit of x (0 or 1), where i=1 corresponds 
-    to the leftmost bit. If i is greater than the bit_length, returns 0.
-
-    Parameters:
-      x (int): The integer whose bits are examined.
-      i (int): The 1-indexed bit position from the left (MSB).
-      bit_length (int): The total number of bits to consider.
-
-    Returns:
-      int: 0 or 1, the value of the specified bit.
-    """
-    bit_pos_from_right = bit_length - i  # Compute zero-indexed position from right.
-    return (x >> bit_pos_from_right) & 1
-
-
-def is_dummy(x):
-    """
-    Determines if an element x is a dummy based on its key.
-
-    Parameters:
-      x (tuple): An element (typically a (key, value) pair or similar).
-
-    Returns:
-      bool: True if the first component equals DUMMY_ADDR, False otherwise.
-    """
-    return x[0] == DUMMY_ADDR
-
-
 def closest_even_number(number):
     """
     Returns the smallest even number that is greater than or equal to the input.
@@ -61,12 +34,28 @@ def next_power_of_two_greater_or_equal(x: int) -> int:
     Returns:
       int: The next power of 2 >= x.
     """
-    p = 1
-    while p < x:
-        p <<= 1  # Multiply by 2.
-    return p
+    if x <= 1:
+        return 1
+    # 2^k >= x exactly when k >= bit_length(x - 1).
+    return 1 << (x - 1).bit_length()
 
 
+def ceil_sqrt(x: int) -> int:
+    """
+    Returns the smallest integer whose square is greater than or equal to x, i.e. ceil(sqrt(x)).
+
+    Parameters:
+      x (int): A non-negative integer.
+
+    Returns:
+      int: ceil(sqrt(x)), computed exactly with integer arithmetic.
+    """
+    if x <= 0:
+        return 0
+    return math.isqrt(x - 1) + 1
+
+
+@functools.lru_cache(maxsize=None)
 def choose_C(n, B):
     """
     Chooses the parameter C for bin packing in the MegaBlocks ORAM project.
@@ -84,6 +73,40 @@ def choose_C(n, B):
     return next_power_of_two_greater_or_equal(val)
 
 
+@functools.lru_cache(maxsize=None)
+def _prf_block_struct(count):
+    """
+    Returns a struct mapping count big-endian 64-bit integers to/from the low halves of consecutive
+    16-byte AES blocks. It packs the keys before encryption and unpacks the low 64 bits of each
+    ciphertext block after it.
+    """
+    return struct.Struct('>' + '8xQ' * count)
+
+
+def prf_bin_indices(cipher, keys, C):
+    """
+    Maps a batch of integer keys to bin indices in [0, C) with a keyed pseudo-random function.
+
+    All keys are packed into a single fixed-width buffer with one struct call and encrypted with one
+    call to the (AES-ECB) cipher, so the per-key cost is a single AES block instead of a full keyed-hash
+    construction. Keys must be non-negative integers below 2^64. Since C is a power of 2, the bin index
+    is the low log2(C) bits of each ciphertext block, read as a machine-sized integer and masked.
+
+    Parameters:
+      cipher: An AES cipher object in ECB mode, created from the secret key.
+      keys (list): The integer keys to be mapped.
+      C (int): The number of bins (a power of 2, as returned by choose_C).
+
+    Returns:
+      list: The bin index of each key, in the same order as keys.
+    """
+    if not keys:
+        return []
+    block_struct = _prf_block_struct(len(keys))
+    mask = C - 1
+    return [value & mask for value in block_struct.unpack(cipher.encrypt(block_struct.pack(*keys)))]
+
+
 def generate_random_string(k):
     """
     Generates a random alphanumeric string of length k.
@@ -108,12 +131,7 @@ def count_reals(mem1):
     Returns:
       int: The total count of real (non-dummy) elements.
     """
-    counter = 0
-    for block in mem1:
-        for item in block:
-            if item[0] != DUMMY_ADDR:
-                counter += 1
-    return counter
+    return sum(1 for block in mem1 for item in block if item[0] != DUMMY_ADDR)
 
 def reset_memory_counters():
     CounterRemoteRam.read_operations = 0
@@ -123,4 +141,17 @@ def reset_memory_counters():
     local_RAM.BALL_READ = 0
     local_RAM.BALL_WRITE = 0
     local_RAM.RT_WRITE = 0
-    local_RAM.RT_READ = 0
\ No newline at end of file
+    local_RAM.RT_READ = 0
+
+
+@contextlib.contextmanager
+def memory_counters_scope():
+    """
+    Context manager that resets the global I/O counters on entry and on exit, so that the I/O counted
+    inside the block is neither polluted by earlier experiments nor carried over to later ones.
+    """
+    reset_memory_counters()
+    try:
+        yield
+    finally:
+        reset_memory_counters()
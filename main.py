@@ -7,6 +7,7 @@ using the helper functions defined in oram_runner.py.
 """
 
 import math
+from config.utils import ceil_sqrt
 from oram_runner import get_oram_instance, run_experiment
 
 
@@ -25,7 +26,7 @@ def main():
     b = 65536  # Physical block size in bits
     B = b // w  # Number of client words per physical block
 
-    q = math.ceil(math.sqrt(B))  # Expansion factor.
+    q = ceil_sqrt(B)  # Expansion factor.
     T = 2 * N  # Total number of ORAM accesses
 
     # Display ORAM implementation options.
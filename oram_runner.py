@@ -9,6 +9,7 @@ computation, and running a complete experiment.
 import sys
 import math
 import random
+import functools
 
 from FutORAMa.Counter_ORAM.futorama import CounterFutORAMa
 from config.constants import SIMULATION_MEGA_BLOCKS_ORAM, MEGA_BLOCKS_ORAM, PATH_ORAM, \
@@ -27,6 +28,12 @@ from PathORAM.Real_ORAM.path_oram import PathORAM
 from RemoteRam.counter_remote_ram import CounterRemoteRam
 from RemoteRam.remote_ram import RemoteRam
 
+# Number of random addresses and operations drawn at once by perform_oram_accesses.
+ACCESS_BATCH_SIZE = 4096
+
+# Dedicated generator for the (non-cryptographic) addresses and operations of the experiments.
+_rng = random.Random()
+
 
 def print_progress_bar(current_index, total_count, label):
     """
@@ -39,11 +46,9 @@ def print_progress_bar(current_index, total_count, label):
     """
     n_bar = 50  # Progress bar width in characters.
     progress_fraction = current_index / total_count
-    sys.stdout.write('\r')
-    sys.stdout.write(
-        f"[{'=' * int(n_bar * progress_fraction):{n_bar}s}] {int(100 * progress_fraction)}%  {label}"
-    )
-    sys.stdout.flush()
+    stdout = sys.stdout
+    stdout.write(f"\r[{'=' * int(n_bar * progress_fraction):{n_bar}s}] {int(100 * progress_fraction)}%  {label}")
+    stdout.flush()
 
 
 def get_oram_instance(choice, N, B, q, T, local_memory=2, b=None, w=None):
@@ -89,8 +94,8 @@ def perform_oram_accesses(oram, N, w_in_bytes, T, addr_range):
     """
     Performs T random ORAM accesses using the provided ORAM instance.
     For each access, a random memory address is chosen and the operation
-    (read or write) is selected randomly. For write operations, random data
-    is generated to match the client word size.
+    (read or write) is selected randomly. The data of each access is padded
+    to the client word size with a random string drawn once per run.
 
     Parameters:
       oram: The ORAM instance to be accessed.
@@ -100,14 +105,61 @@ def perform_oram_accesses(oram, N, w_in_bytes, T, addr_range):
       addr_range (int): Range for randomly generating addresses.
     """
     progress_interval = T // 100 if T >= 100 else 1
-    for i in range(T):
-        if i % progress_interval == 0:
-            print_progress_bar(i // progress_interval, 100, "progress")
-        data = "d" + str(i)
-        addr = random.randint(0, addr_range - 1)
-        op = random.choice([READ_OPERATION, WRITE_OPERATION])
-        data += generate_random_string(w_in_bytes - len(data))
-        oram.access(op, addr, data)
+    # Index of the next access at which the progress bar is updated, and the progress shown there.
+    next_tick = 0
+    tick = 0
+    oram_access = oram.access
+    addresses = range(addr_range)
+    operations = (READ_OPERATION, WRITE_OPERATION)
+    # A single random padding string is drawn once; each payload is the access tag "d<i>" followed by the
+    # remainder of the padding, so it still has the client word size.
+    padding = generate_random_string(w_in_bytes)
+    choices = _rng.choices
+    # The addresses and operations are drawn in batches of ACCESS_BATCH_SIZE with a single call each.
+    for start in range(0, T, ACCESS_BATCH_SIZE):
+        count = min(ACCESS_BATCH_SIZE, T - start)
+        batch = zip(range(start, start + count), choices(addresses, k=count), choices(operations, k=count))
+        for i, addr, op in batch:
+            if i == next_tick:
+                print_progress_bar(tick, 100, "progress")
+                tick += 1
+                next_tick += progress_interval
+            tag = "d" + str(i)
+            oram_access(op, addr, tag + padding[len(tag):])
+
+
+def perform_simulation_accesses(oram, T):
+    """
+    Performs T accesses on a counter simulation ORAM (SimulationMegaBlocksORAM).
+
+    The simulated I/O does not depend on the accessed addresses, operations or data, so unlike
+    perform_oram_accesses no random addresses or payloads are generated.
+
+    Parameters:
+      oram: The simulation ORAM instance to be accessed.
+      T (int): Total number of accesses to perform.
+    """
+    progress_interval = T // 100 if T >= 100 else 1
+    oram_access = oram.access
+    for tick, start in enumerate(range(0, T, progress_interval)):
+        print_progress_bar(tick, 100, "progress")
+        for _ in range(min(progress_interval, T - start)):
+            oram_access(READ_OPERATION, 0, None)
+
+
+@functools.lru_cache(maxsize=16)
+def natural_logs(N):
+    """
+    Returns ln(N) and ln(ln(N)), which are shared by all the experiments of a table with the same N.
+
+    Parameters:
+      N (int): Total number of logical memory blocks.
+
+    Returns:
+      tuple: The pair (ln(N), ln(ln(N))).
+    """
+    ln_n = math.log(N)
+    return ln_n, math.log(ln_n)
 
 
 def print_operation_stats(total_ops, N, B, T, w, q, b, choice):
@@ -125,42 +177,50 @@ def print_operation_stats(total_ops, N, B, T, w, q, b, choice):
       b (int): Physical block size.
       choice (str): The ORAM mode used.
     """
-    print("\n")
-    print("N =", N)
-    print("B =", B)
-    print("w =", w)
-    print("q =", q)
-    print("b =", b)
-    print("b in KB =", b / (1024 * 8))
-
-    log_n_loglog_n = math.log(N) / math.log(math.log(N))
-    log_q_n = math.log(N, q)
-    amortized_theory = 4 * log_q_n + 2 + 2 / q + 20 / (q - 1) + 16 / B
-    log_noB_logB = math.log(N) / math.log(B)
-    total_accesses_log_q_n = T * log_q_n
-    total_accesses_log_n_loglog_n = T * log_n_loglog_n
-    total_accesses_theory = T * amortized_theory
-    total_accesses_log_n_log_B = total_ops / (log_noB_logB * T)
     io_overhead = total_ops / T
     bandwidth_overhead = (b * io_overhead) / 2 ** 13
 
-    print("Total read and write operations:", total_ops)
-    print("Bandwidth Overhead in KB: {} KB".format(bandwidth_overhead))
-    print("Bandwidth Overhead in MB: {} MB".format(bandwidth_overhead / 1024))
-    print("I/O overhead per access:", io_overhead)
+    # The report is assembled line by line and written to stdout at once.
+    lines = ["\n",
+             f"N = {N}",
+             f"B = {B}",
+             f"w = {w}",
+             f"q = {q}",
+             f"b = {b}",
+             f"b in KB = {b / (1024 * 8)}",
+             f"Total read and write operations: {total_ops}",
+             f"Bandwidth Overhead in KB: {bandwidth_overhead} KB",
+             f"Bandwidth Overhead in MB: {bandwidth_overhead / 1024} MB",
+             f"I/O overhead per access: {io_overhead}"]
+    # The theoretical ratios are only reported (and computed) for the MegaBlocks models.
     if choice in [MEGA_BLOCKS_ORAM, SIMULATION_MEGA_BLOCKS_ORAM, COUNTER_MEGA_BLOCKS_ORAM]:
-        print("I/O Overhead Theoretical Amortized Cost (4L + 2 + o(1)) =", amortized_theory)
-        print("T * Theoretical Amortized Cost =", T * amortized_theory)
-        print("Ratio: Total ops / (T * Theoretical Amortized Cost) =", total_ops / total_accesses_theory)
-        print("Ratio: Total ops / (T * log_q(N)) =", total_ops / total_accesses_log_q_n)
-        print("Ratio: Total ops / (T * log(N)/loglog(N)) =", total_ops / total_accesses_log_n_loglog_n)
-        print("Ratio: Total ops / (T * log(N)/log(B)) =", total_accesses_log_n_log_B)
-        error_prob = T * log_n_loglog_n * math.exp(-(B / 6))
-        print("Error probability:", error_prob)
-        if error_prob > 0:
-            print("Log2(Error probability):", math.log(error_prob, 2))
+        ln_n, ln_ln_n = natural_logs(N)
+        log_n_loglog_n = ln_n / ln_ln_n
+        log_q_n = ln_n / math.log(q)
+        amortized_theory = 4 * log_q_n + 2 + 2 / q + 20 / (q - 1) + 16 / B
+        log_noB_logB = ln_n / math.log(B)
+        total_accesses_log_q_n = T * log_q_n
+        total_accesses_log_n_loglog_n = T * log_n_loglog_n
+        total_accesses_theory = T * amortized_theory
+        total_accesses_log_n_log_B = total_ops / (log_noB_logB * T)
+        lines += [f"I/O Overhead Theoretical Amortized Cost (4L + 2 + o(1)) = {amortized_theory}",
+                  f"T * Theoretical Amortized Cost = {T * amortized_theory}",
+                  f"Ratio: Total ops / (T * Theoretical Amortized Cost) = {total_ops / total_accesses_theory}",
+                  f"Ratio: Total ops / (T * log_q(N)) = {total_ops / total_accesses_log_q_n}",
+                  f"Ratio: Total ops / (T * log(N)/loglog(N)) = {total_ops / total_accesses_log_n_loglog_n}",
+                  f"Ratio: Total ops / (T * log(N)/log(B)) = {total_accesses_log_n_log_B}"]
+        if log_n_loglog_n > 0:
+            # log2 of the error probability T * log(N)/loglog(N) * e^(-B/6), computed in log space so that it
+            # stays finite when the probability itself underflows to 0.
+            log2_error_prob = math.log2(T) + math.log2(log_n_loglog_n) - (B / 6) * math.log2(math.e)
+            lines += [f"Error probability: {2.0 ** log2_error_prob}",
+                      f"Log2(Error probability): {log2_error_prob}"]
         else:
-            print("Log2(Error probability) > 1000")
+            # For N < e (i.e. N = 2), loglog(N) is negative and so is the probability, which therefore has no log2.
+            lines += [f"Error probability: {T * log_n_loglog_n * math.exp(-(B / 6))}",
+                      "Log2(Error probability) > 1000"]
+    lines.append("")
+    sys.stdout.write("\n".join(lines))
 
 
 def run_experiment(oram, choice, N, B, w_in_bytes, T, w, q, b):
@@ -186,7 +246,9 @@ def run_experiment(oram, choice, N, B, w_in_bytes, T, w, q, b):
     if choice == PATH_ORAM:
         address_range = math.ceil(N / B)
 
-    if choice in [SIMULATION_MEGA_BLOCKS_ORAM, MEGA_BLOCKS_ORAM, PATH_ORAM]:
+    if choice == SIMULATION_MEGA_BLOCKS_ORAM:
+        perform_simulation_accesses(oram=oram, T=T)
+    elif choice in [MEGA_BLOCKS_ORAM, PATH_ORAM]:
         perform_oram_accesses(oram=oram, N=N, w_in_bytes=w_in_bytes, T=T, addr_range=address_range)
 
     if choice == SIMULATION_MEGA_BLOCKS_ORAM:
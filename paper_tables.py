@@ -1,10 +1,15 @@
+import argparse
+import contextlib
+import io
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from config.constants import SIMULATION_MEGA_BLOCKS_ORAM, COUNTER_MEGA_BLOCKS_ORAM, \
     COUNTER_PATH_ORAM, MEGA_BLOCKS_ORAM, COUNTER_FUTORAMA
-from config.utils import reset_memory_counters
+from config.utils import ceil_sqrt, memory_counters_scope
 from oram_runner import get_oram_instance, run_experiment
 
-def run_table_1():
+def run_table_1(b_filter=None):
     """
     Table 1 Experiment – Large-Scale Comparison: MegaBlocksORAM vs. Path ORAM (Block Size Range).
 
@@ -13,24 +18,31 @@ def run_table_1():
     CounterPathORAM, choice '4') over a narrower range of physical block sizes (from 4 KB to 64 KB).
     This setup focuses on the detailed performance (I/O cost, bandwidth overhead, and local memory usage)
     of our scheme versus Path ORAM in a regime that is typical for modern storage devices.
+
+    Parameters:
+      b_filter (collection of int, optional): If given, only the block sizes b in b_filter are run, so that
+        the table can be split across several runs (see main).
     """
     w = 64
     TB = 2 ** 43
     N = TB // w
+    log_n = N.bit_length() - 1  # N is a power of two, so this is log2(N)
     KB = 2 ** 13
     b_sizes = [4 * KB, 8 * KB, 16 * KB, 32 * KB, 64 * KB]
-    for b in b_sizes:
-        B = b // w
-        q = math.ceil(math.sqrt(B))
+    if b_filter is not None:
+        b_sizes = [b for b in b_sizes if b in b_filter]
+    local_memory = 400
+    T = 2 * N
+    # (b, B, q) of every experiment, derived once before the experiments run.
+    block_params = [(b, b // w, ceil_sqrt(b // w)) for b in b_sizes]
+    for b, B, q in block_params:
         print("Mega Blocks ORAM\n")
-        local_memory = 400
-        T = 2 * N
         choice = COUNTER_MEGA_BLOCKS_ORAM
         oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - 4)
         run_experiment(oram, choice, N, B, w // 8, T, w, q, b)
         print("Path ORAM\n")
         choice = COUNTER_PATH_ORAM
-        path_oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - math.log(N, 2), b=b, w=w)
+        path_oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - log_n, b=b, w=w)
         run_experiment(path_oram, choice, N, B, w // 8, T, w, q, b)
         print("b size: " + str(b // KB) + " KB")
         print("Local memory in server blocks: " + str(local_memory))
@@ -38,7 +50,7 @@ def run_table_1():
         print("Local memory in GB: " + str(local_memory * b / (2 ** 33)))
 
 
-def run_table_2():
+def run_table_2(b_filter=None):
     """
     Table 2 Experiment – Large-Scale Comparison: MegaBlocksORAM vs. Path ORAM vs. FutORAMa with Large Local Memory.
 
@@ -47,40 +59,75 @@ def run_table_2():
     CounterPathORAM, choice '4') in a high–resource setting with large local memory (131,220 server blocks).
     Physical block sizes are varied over a wide range to assess the I/O overhead
     and bandwidth impact. We used the simulation mode of FutORAMa (See the code of FutORAMa for more details).
+
+    Parameters:
+      b_filter (collection of int, optional): If given, only the block sizes b in b_filter are run, so that
+        the table can be split across several runs (see main).
     """
     w = 64
     TB = 2 ** 43
-    N = TB // w
     KB = 2 ** 13
     Byte = 2 ** 3
     b_sizes = [32 * Byte, 256 * Byte, 512 * Byte, 1 * KB, 4 * KB, 8 * KB, 16 * KB, 32 * KB, 64 * KB, 128 * KB]
-    for b in b_sizes:
-        B = b // w
-        q = math.ceil(math.sqrt(B))
+    if b_filter is not None:
+        b_sizes = [b for b in b_sizes if b in b_filter]
+    local_memory = 131_220
+    # The three experiments of each block size run together in one process, and the block sizes run in
+    # parallel; the output is printed in the order of b_sizes.
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        outputs = [executor.submit(_run_table_2_row, b, B, q, TB, w, local_memory)
+                   for b, B, q in [(b, b // w, ceil_sqrt(b // w)) for b in b_sizes]]
+        for output in outputs:
+            print(output.result(), end="")
+
+
+def _run_table_2_row(b, B, q, TB, w, local_memory):
+    """
+    Runs the MegaBlocks, Path ORAM and FutORAMa experiments of Table 2 for a single block size.
+
+    Parameters:
+      b (int): The physical block size (in bits).
+      B (int): The number of client words per physical block.
+      q (int): The expansion factor.
+      TB (int): The logical memory size (in bits).
+      w (int): The client word size (in bits).
+      local_memory (int): The local memory (in server blocks).
+
+    Returns:
+      str: The text printed by the experiments.
+    """
+    KB = 2 ** 13
+    Byte = 2 ** 3
+    N = TB // w
+    log_n = N.bit_length() - 1  # N is a power of two, so this is log2(N)
+    T = 2 * N
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
         print("Mega Blocks ORAM\n")
-        local_memory = 131_220
-        T = 2 * N
         if b >= KB:
             choice = COUNTER_MEGA_BLOCKS_ORAM
             oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - 4)
-            run_experiment(oram, choice, N, B, w // 8, T, w, q, b)
+            with memory_counters_scope():
+                run_experiment(oram, choice, N, B, w // 8, T, w, q, b)
         print("Path ORAM\n")
         choice = COUNTER_PATH_ORAM
-        path_oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - math.log(N, 2), b=b, w=w)
-        run_experiment(path_oram, choice, N, B, w // 8, T, w, q, b)
+        path_oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory - log_n, b=b, w=w)
+        with memory_counters_scope():
+            run_experiment(path_oram, choice, N, B, w // 8, T, w, q, b)
         print("FutORAMa\n")
         choice = COUNTER_FUTORAMA
-        futorama = get_oram_instance(choice, TB, B, q, T, local_memory=local_memory - math.log(N, 2), w=1, b=b)
-        reset_memory_counters()
-        run_experiment(futorama, choice, N, B, w // 8, T, w, q, b)
+        futorama = get_oram_instance(choice, TB, B, q, T, local_memory=local_memory - log_n, w=1, b=b)
+        with memory_counters_scope():
+            run_experiment(futorama, choice, N, B, w // 8, T, w, q, b)
         print("b size in B: " + str(b // Byte) + " B")
         print("b size in KB: " + str(b // KB) + " KB")
         print("Local memory in server blocks: " + str(local_memory))
         print("Local memory in MB: " + str(local_memory * b / (2 ** 23)))
         print("Local memory in GB: " + str(local_memory * b / (2 ** 33)))
+    return output.getvalue()
 
 
-def run_table_3():
+def run_table_3(b_filter=None):
     """
     Table 3 Experiment – Comparison of the Three Models of Our ORAM.
 
@@ -89,21 +136,54 @@ def run_table_3():
     size (b) over a range [w^3, 2·w^3, 4·w^3, 8·w^3, 16·w^3, 32·w^3]. The three models,
     corresponding to choices '1', '2', and '5', are evaluated under identical conditions,
     allowing a direct comparison of their I/O overhead and bandwidth performance.
+
+    Parameters:
+      b_filter (collection of int, optional): If given, only the block sizes b in b_filter are run, so that
+        the table can be split across several runs (see main).
     """
     N = int(math.pow(2, 16))
     w = 32
     local_memory = 4
     choices = [SIMULATION_MEGA_BLOCKS_ORAM, MEGA_BLOCKS_ORAM, COUNTER_MEGA_BLOCKS_ORAM]
     poss_b = [w ** 3, 2 * w ** 3, 4 * w ** 3, 8 * w ** 3, 16 * w ** 3, 32 * w ** 3]
-    for pos in poss_b:
-        for choice in choices:
-            print("Mode " + choice)
-            B = pos // w
-            q = math.ceil(math.sqrt(B))
-            T = 2 * N
-            oram = get_oram_instance(choice, N, B, q, T, local_memory)
-            run_experiment(oram, choice, N, B, w // 8, T, w, q, pos)
-        print("#####################################\n\n\n\n\n")
+    if b_filter is not None:
+        poss_b = [b for b in poss_b if b in b_filter]
+    # The (b, choice) experiments are independent, so they run in separate processes and their output is
+    # printed in the original order once each one has finished.
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        outputs = [[executor.submit(_run_table_3_experiment, pos, choice, N, w, local_memory) for choice in choices]
+                   for pos in poss_b]
+        for row in outputs:
+            for output in row:
+                print(output.result(), end="")
+            print("#####################################\n\n\n\n\n")
+
+
+def _run_table_3_experiment(pos, choice, N, w, local_memory):
+    """
+    Runs a single (block size, ORAM model) experiment of Table 3.
+
+    The experiment runs in a fresh memory counters scope, since a worker process may have run an earlier one.
+
+    Parameters:
+      pos (int): The physical block size b (in bits).
+      choice (str): The ORAM model to run.
+      N (int): The number of memory blocks used by the client.
+      w (int): The client word size (in bits).
+      local_memory (int): The local memory (in server blocks).
+
+    Returns:
+      str: The text printed by the experiment.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), memory_counters_scope():
+        print("Mode " + choice)
+        B = pos // w
+        q = ceil_sqrt(B)
+        T = 2 * N
+        oram = get_oram_instance(choice, N, B, q, T, local_memory)
+        run_experiment(oram, choice, N, B, w // 8, T, w, q, pos)
+    return output.getvalue()
 
 
 def run_table_4():
@@ -120,7 +200,7 @@ def run_table_4():
     w = 32
     b = w ** 3
     B = b // w
-    q = math.ceil(math.sqrt(B))
+    q = ceil_sqrt(B)
     T = 2 * N
     choice = COUNTER_MEGA_BLOCKS_ORAM
     local_memories = [2 ** i for i in range(1, 30)]
@@ -152,7 +232,7 @@ def run_table_5():
     for p in poss_power_N:
         N = int(math.pow(2, p))
         B = b // w
-        q = math.ceil(math.sqrt(B))
+        q = ceil_sqrt(B)
         T = 2 * N
         choice = COUNTER_MEGA_BLOCKS_ORAM
         oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory)
@@ -175,9 +255,34 @@ def run_table_6():
     B = b // w
     w_in_bytes = math.ceil(w / 8)
     local_memory = 6
-    possible_q = [i for i in range(math.floor(math.sqrt(B)), math.floor(B / math.log(N, 2)) + 1)]
+    possible_q = [i for i in range(math.isqrt(B), math.floor(B / (N.bit_length() - 1)) + 1)]
     for q in possible_q:
         T = 2 * N
         choice = SIMULATION_MEGA_BLOCKS_ORAM
         oram = get_oram_instance(choice, N, B, q, T, local_memory=local_memory)
         run_experiment(oram, choice, N, B, w_in_bytes, T, w, q, b)
+
+
+def main():
+    """
+    Command line entry point: runs one of the paper tables.
+
+    For Tables 1-3, --b restricts the run to some of the table's block sizes (in bits), e.g.
+    "python paper_tables.py 2 --b 8192,16384", so that a table can be split across several runs or hosts.
+    """
+    tables = {1: run_table_1, 2: run_table_2, 3: run_table_3, 4: run_table_4, 5: run_table_5, 6: run_table_6}
+    parser = argparse.ArgumentParser(description="Reproduce an experiment table of the paper.")
+    parser.add_argument("table", type=int, choices=sorted(tables), help="The number of the table to run.")
+    parser.add_argument("--b", type=lambda value: {int(b) for b in value.split(",")},
+                        help="Comma-separated physical block sizes (in bits) to run (Tables 1-3 only).")
+    args = parser.parse_args()
+    if args.b is None:
+        tables[args.table]()
+    elif args.table in (1, 2, 3):
+        tables[args.table](b_filter=args.b)
+    else:
+        parser.error("--b is only supported for Tables 1-3")
+
+
+if __name__ == '__main__':
+    main()